@@ -0,0 +1,75 @@
+import warnings
+
+import numpy as np
+
+from vec3 import vec3
+from packed import SPHERE, TRIANGLE, PLANE, sphere_kernel, triangle_kernel, plane_kernel, nearest, any_hit
+
+
+# Rechenkerne für Schnitt, Schattentest und Beleuchtung, austauschbar zur Laufzeit
+# (Scene.backend bzw. PackedScene(..., backend=...)):
+#   "numpy"  die numpy-Ausdrücke aus packed.py und shade(), Referenz, läuft überall
+#   "numba"  eine Schleife je Strahl, kompiliert mit Numba, parallel über prange, ohne
+#            Zwischenarrays für (Primitive x Strahlen); ohne installiertes Numba: "numpy"
+#   "auto"   "numba", falls vorhanden, sonst "numpy"
+# Jedes Backend hat dieselben Methoden:
+#   nearest(kind, arrays, O, D, faraway)  -> (Distanz, Zeile bzw. -1) je Strahl, wie packed.nearest
+#   any_hit(kind, arrays, O, D, maxdist, faraway, owner, skip) -> verdeckt je Strahl, wie packed.any_hit
+#   lighting(N, toO, toL, seelight, C)    -> (Lambert, Glanz), je (3, k) Summe über alle Lichtproben
+# kind ist SPHERE, TRIANGLE oder PLANE, arrays die Arrays des Typs aus der PackedScene.
+
+class NumpyBackend:
+    name = "numpy"
+    kernels = {SPHERE: sphere_kernel, TRIANGLE: triangle_kernel, PLANE: plane_kernel}
+
+    def nearest(self, kind, arrays, O, D, faraway):
+        return nearest(self.kernels[kind], arrays, O, D, faraway)
+
+    def any_hit(self, kind, arrays, O, D, maxdist, faraway, owner=None, skip=None):
+        return any_hit(self.kernels[kind], arrays, O, D, maxdist, faraway, owner, skip)
+
+    # N, toO (vec3, je Treffer k), toL (vec3, normierte Richtung zum Licht, Strahl j * k + t für
+    # Probe j und Treffer t, wird überschrieben), seelight (S * k) und Lichtfarben C (3, S)
+    def lighting(self, N, toO, toL, seelight, C):
+        S = C.shape[1]
+        k = len(seelight) // max(S, 1)
+        (Nt, toOt) = (N, toO) if S == 1 else (vec3(np.tile(N.a, S)), vec3(np.tile(toO.a, S)))
+        # Lambert shading (diffuse)
+        lv = np.maximum(Nt.dot(toL), 0)
+        lambert = (C[:, :, None] * (lv * seelight).reshape(S, k)).sum(axis=1)
+        # Blinn-Phong shading (specular)
+        toL += toOt
+        phong = Nt.dot(toL.normalize())
+        glanz = (C[:, :, None] * (np.power(np.clip(phong, 0, 1), 50) * seelight).reshape(S, k)).sum(axis=1)
+        return (lambert, glanz)
+
+
+NUMPY = NumpyBackend()
+
+def lade_numba():
+    import numba_backend # braucht numba, Kompilieren beim ersten Aufruf je Genauigkeit
+    return numba_backend.NumbaBackend()
+
+BACKENDS = {"numpy": lambda: NUMPY, "numba": lade_numba}
+
+# schon angelegte Backends, Numba-Kernel werden so nur einmal je Prozess geladen
+geladen = {}
+
+def get_backend(name="numpy"):
+    if not isinstance(name, str): # schon ein Backend
+        return name
+    if name not in geladen:
+        if name == "auto":
+            try:
+                geladen[name] = BACKENDS["numba"]()
+            except ImportError:
+                geladen[name] = NUMPY
+        elif name not in BACKENDS:
+            raise ValueError("unbekanntes Backend %r, möglich: auto, %s" % (name, ", ".join(BACKENDS)))
+        else:
+            try:
+                geladen[name] = BACKENDS[name]()
+            except ImportError as e:
+                warnings.warn("Backend %r nicht verfügbar (%s), rechne mit numpy" % (name, e))
+                geladen[name] = NUMPY
+    return geladen[name]
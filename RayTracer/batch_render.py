@@ -0,0 +1,134 @@
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from daudrich_raytracer import Scene
+from framebuffer import open_image
+
+
+# Rendert Scene.raytrace_image ohne Fenster/OpenGL-Kontext, z.B. auf Rechenknoten:
+#   python batch_render.py --width 1920 --height 1080 --frames 20 --output out/frame_%04d.png
+# Jedes fertige Bild wird sofort geschrieben (nichts von der Sequenz bleibt im Speicher),
+# die Zeiten je Bild gehen nach stdout. Mit --memmap wird kachelweise direkt in die Datei
+# (.ppm oder .npy) gerendert, dann hängt der Speicherbedarf nur von --tile-size ab (z.B. für 16K).
+
+
+def write_ppm(path, pixels):
+    (h, w, d) = pixels.shape
+    with open(path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (w, h))
+        f.write(np.ascontiguousarray(pixels).tobytes())
+
+
+# PNG nur mit zlib, damit kein Pillow gebraucht wird
+def write_png(path, pixels):
+    (h, w, d) = pixels.shape
+
+    def chunk(typ, data):
+        return struct.pack(">I", len(data)) + typ + data + struct.pack(">I", zlib.crc32(typ + data) & 0xffffffff)
+
+    zeilen = np.zeros((h, 1 + w * d), dtype=np.uint8) # je Zeile Filterbyte 0, dann RGB
+    zeilen[:, 1:] = pixels.reshape(h, w * d)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(zeilen.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+WRITERS = {".ppm": write_ppm, ".png": write_png, ".npy": lambda path, pixels: np.save(path, pixels)}
+
+
+# Bild aus raytrace_image (Puffer in Zeilen von oben nach unten, wie für die Textur) als (height, width, 3) uint8
+def to_pixels(scene, image):
+    return image.reshape(scene.height, scene.width, 3).astype(np.uint8)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Raytracer ohne Fenster rendern, Bilder einzeln auf die Platte schreiben")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=1, help="Anzahl Bilder der Drehung")
+    parser.add_argument("--start", type=int, default=0, help="Drehung des ersten Bildes in Schritten von pi/10")
+    parser.add_argument("--step", type=int, default=1, help="Drehschritte (pi/10) von Bild zu Bild, negativ = andere Richtung")
+    parser.add_argument("--output", default="frame_%04d.ppm", help="Dateiname mit %%d für die Bildnummer, .ppm, .png oder .npy")
+    parser.add_argument("--memmap", action="store_true", help="kachelweise direkt in die Datei rendern (.ppm oder .npy), schon während des Renderns lesbar")
+    parser.add_argument("--model", help="OBJ-Datei, die als Mesh in die Szene kommt (z.B. ../oglViewer/models/bunny.obj)")
+    parser.add_argument("--accel", choices=("bvh", "packed", "list"), default="bvh")
+    parser.add_argument("--backend", choices=("numpy", "numba", "auto"), default="numpy", help="Rechenkerne, siehe backend.py")
+    parser.add_argument("--precision", choices=("float64", "float32"), default="float64")
+    parser.add_argument("--workers", type=int, default=1, help="> 1: Kacheln auf so vielen Prozessen")
+    parser.add_argument("--tile-size", type=int, default=64)
+    parser.add_argument("--nodes", nargs="+", default=[], help="Render-Knoten (host:port oder Unix-Socket), siehe distributed.py")
+    parser.add_argument("--profile", action="store_true", help="Zeit, Strahlen und Speicher je Stufe für jedes Bild ausgeben")
+    parser.add_argument("--trace", help="Chrome-Trace des letzten Bildes in diese Datei (mit --profile)")
+    args = parser.parse_args(argv)
+    if args.frames < 1 or args.width < 1 or args.height < 1:
+        parser.error("--frames, --width und --height müssen mindestens 1 sein")
+    if os.path.splitext(args.output)[1].lower() not in WRITERS:
+        parser.error("--output muss auf .ppm, .png oder .npy enden")
+    if args.memmap and os.path.splitext(args.output)[1].lower() == ".png":
+        parser.error("--memmap geht nur mit .ppm oder .npy")
+    if args.frames > 1 and "%" not in args.output:
+        parser.error("--output braucht bei mehreren Bildern ein %d-Feld")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    write = WRITERS[os.path.splitext(args.output)[1].lower()]
+
+    scene = Scene(args.width, args.height, "Batch")
+    scene.model = args.model
+    scene.accel = args.accel
+    scene.backend = args.backend
+    scene.precision = np.dtype(args.precision).type
+    scene.workers = args.workers
+    scene.tile_size = args.tile_size
+    scene.nodes = args.nodes
+    scene.profile = args.profile
+
+    pixel = args.width * args.height
+    gesamt = time.perf_counter()
+    zeiten = []
+    for frame in range(args.frames):
+        drehung = args.start + frame * args.step
+        (scene.anzahlPos, scene.anzahlNeg) = (max(drehung, 0), max(-drehung, 0))
+
+        path = args.output % frame if "%" in args.output else args.output
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        start = time.perf_counter()
+        if args.memmap:
+            image = scene.raytrace_image(out=open_image(path, args.width, args.height))
+            del image # schreibt die restlichen Seiten
+            render = time.perf_counter() - start
+        else:
+            image = scene.raytrace_image()
+            render = time.perf_counter() - start
+            write(path, to_pixels(scene, image))
+            del image
+        schreiben = time.perf_counter() - start - render
+
+        zeiten.append(render)
+        print("Bild %d/%d (Drehung %d): %.3f s rendern, %.3f s schreiben, %.2f MPixel/s -> %s"
+              % (frame + 1, args.frames, drehung, render, schreiben, pixel / render / 1e6, path), flush=True)
+        if scene.workers > 1 or scene.nodes:
+            print("  " + scene.tile_report(), flush=True)
+        if scene.profile:
+            print(scene.format_profile(), flush=True)
+
+    if args.profile and args.trace:
+        scene.dump_profile(args.trace, "chrome")
+    wand = time.perf_counter() - gesamt
+    print("%d Bilder %dx%d in %.2f s: Rendern min %.3f s, mittel %.3f s, max %.3f s, %.2f MPixel/s gesamt"
+          % (args.frames, args.width, args.height, wand, min(zeiten), np.mean(zeiten), max(zeiten),
+             pixel * args.frames / wand / 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
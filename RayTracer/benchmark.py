@@ -0,0 +1,150 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import daudrich_raytracer as rt
+from daudrich_raytracer import Scene, Sphere, Triangle, Plane
+from vec3 import vec3
+
+
+# Benchmarks für den Raytracer, ohne Fenster (läuft auf jedem Linux-Rechner ohne GPU):
+#   python benchmark.py                 # alles
+#   python benchmark.py --quick         # kleine Größen, z.B. vor jedem Commit
+#   python benchmark.py --json b.json   # Ergebnisse zusätzlich als JSON, zum Vergleichen zweier Stände
+#   python benchmark.py --compare b.json --tolerance 0.1   # Exit-Code 1, wenn ein Fall > 10 % langsamer ist
+# Je Fall: beste Zeit aus --repeat Läufen, Strahlen pro Sekunde und Spitzenspeicher eines
+# Laufs (tracemalloc, also alle numpy-Arrays) plus die Größe der wiederverwendeten vec3-Puffer
+# (die wachsen nur und bleiben über alle Fälle bestehen, zeigen also den bisher größten Bedarf).
+
+
+# Szene aus zufälligen Kugeln über der Bodenebene, immer gleich für dieselbe Anzahl
+class RandomScene(Scene):
+    def __init__(self, width, height, anzahl, seed=1):
+        super().__init__(width, height, "Benchmark")
+        self.anzahl = anzahl
+        self.seed = seed
+
+    def scene_objects(self):
+        zufall = np.random.default_rng(self.seed)
+        scene = [Plane(vec3(0, -1, 0), vec3(0, 1, 0), vec3(1, 1, 1))]
+        for i in range(self.anzahl):
+            (x, y, z) = zufall.uniform((-3, -.9, 1), (3, 3, 10))
+            scene.append(Sphere(vec3(x, y, z), zufall.uniform(.05, .3), vec3(*zufall.uniform(0, 1, 3))))
+        return scene
+
+
+# beste Zeit aus wiederholungen Läufen (nach einem zum Aufwärmen) und Spitzenspeicher eines Laufs
+def messen(fn, wiederholungen):
+    fn()
+    zeiten = []
+    for i in range(wiederholungen):
+        start = time.perf_counter()
+        fn()
+        zeiten.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    spitze = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (min(zeiten), spitze)
+
+
+def ergebnis(name, sekunden, strahlen, spitze):
+    return {"name": name, "seconds": sekunden, "rays": strahlen, "rays_per_s": strahlen / sekunden,
+            "peak_mb": spitze / 2**20}
+
+
+# Schnittberechnung einzelner Objekte gegen n zufällige Strahlen
+def micro(n, wiederholungen):
+    zufall = np.random.default_rng(0)
+    richtung = zufall.normal(size=(3, n))
+    richtung[2] = np.abs(richtung[2]) # grob in die Szene
+    D = vec3(*richtung).norm()
+    O = rt.E
+    objekte = {
+        "Sphere.intersect": Sphere(vec3(0, .3, 1.2), .4, vec3(1, 0, 0)),
+        "Triangle.intersect": Triangle(vec3(-.5, .3, 1.2), vec3(.5, .3, 1.2), vec3(0, 1.2, 1.2), vec3(1, 1, 0)),
+        "Plane.intersect": Plane(vec3(0, -1, 0), vec3(0, 1, 0), vec3(1, 1, 1)),
+    }
+    for (name, obj) in objekte.items():
+        (sekunden, spitze) = messen(lambda: obj.intersect(O, D), wiederholungen)
+        yield ergebnis("%s n=%d" % (name, n), sekunden, n, spitze)
+
+
+# ein ganzes Bild (ohne Vorschau und Cache), Strahlen = Primärstrahlen (Pixel)
+def bild(name, scene, wiederholungen, bounces=2):
+    scene.progressive = False
+    scene.max_bounce = bounces
+    (sekunden, spitze) = messen(scene.raytrace_image, wiederholungen)
+    return ergebnis(name, sekunden, scene.width * scene.height, spitze)
+
+
+def macro(quick, accel, wiederholungen, backend="numpy"):
+    aufloesungen = ((160, 120), (320, 240)) if quick else ((160, 120), (320, 240), (640, 480), (1280, 960))
+    for (w, h) in aufloesungen:
+        scene = Scene(w, h)
+        scene.accel = accel
+        scene.backend = backend
+        yield bild("raytrace %dx%d" % (w, h), scene, wiederholungen)
+
+    (w, h) = (160, 120) if quick else (320, 240)
+    for bounces in (0, 1, 2, 3):
+        scene = Scene(w, h)
+        scene.accel = accel
+        scene.backend = backend
+        yield bild("raytrace %dx%d bounces=%d" % (w, h, bounces), scene, wiederholungen, bounces)
+
+    for anzahl in ((10, 100) if quick else (10, 100, 1000)):
+        scene = RandomScene(w, h, anzahl)
+        scene.accel = accel
+        scene.backend = backend
+        yield bild("raytrace %dx%d random spheres=%d" % (w, h, anzahl), scene, wiederholungen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Raytracer-Benchmarks ohne Fenster")
+    parser.add_argument("--quick", action="store_true", help="nur kleine Größen")
+    parser.add_argument("--repeat", type=int, default=3, help="Läufe je Fall, gemeldet wird der schnellste")
+    parser.add_argument("--accel", choices=("bvh", "packed", "list"), default="bvh")
+    parser.add_argument("--backend", choices=("numpy", "numba", "auto"), default="numpy", help="Rechenkerne, siehe backend.py")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich in diese Datei schreiben")
+    parser.add_argument("--compare", help="JSON eines früheren Laufs, gegen den verglichen wird")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="erlaubter Zeitzuwachs beim Vergleich (Anteil)")
+    args = parser.parse_args(argv)
+
+    ergebnisse = []
+    print("%-45s %10s %14s %10s" % ("Fall", "ms", "Strahlen/s", "Spitze MB"))
+    faelle = [micro(10000 if args.quick else 1000000, args.repeat), macro(args.quick, args.accel, args.repeat, args.backend)]
+    for fall in faelle:
+        for e in fall:
+            ergebnisse.append(e)
+            print("%-45s %10.1f %14.0f %10.1f" % (e["name"], 1000 * e["seconds"], e["rays_per_s"],
+                                                e["peak_mb"]), flush=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"accel": args.accel, "backend": args.backend, "quick": args.quick, "results": ergebnisse}, f, indent=1)
+    if args.compare:
+        return vergleichen(ergebnisse, args.compare, args.tolerance)
+    return 0
+
+
+# vergleicht mit einem früheren Lauf, 1 wenn ein Fall mehr als tolerance langsamer geworden ist
+def vergleichen(ergebnisse, path, tolerance):
+    with open(path) as f:
+        vorher = {e["name"]: e for e in json.load(f)["results"]}
+    langsamer = 0
+    for e in ergebnisse:
+        if e["name"] not in vorher:
+            continue
+        faktor = e["seconds"] / vorher[e["name"]]["seconds"]
+        if faktor > 1 + tolerance:
+            langsamer += 1
+        print("%-45s %6.2fx%s" % (e["name"], faktor, "  LANGSAMER" if faktor > 1 + tolerance else ""))
+    return 1 if langsamer else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import numpy as np
+
+from packed import PackedScene
+
+
+# Bounding Volume Hierarchy (binned SAH) über die Primitive einer PackedScene (auch die Dreiecke der Meshes).
+# Die Blätter werden mit den Kerneln der PackedScene (bzw. ihres Backends) getestet,
+# Ebenen (unendlich, passen in keine Box) wie bisher immer gegen alle Strahlen.
+class BVH(PackedScene):
+    def __init__(self, objects, faraway, dtype=np.float64, leaf_size=16, bins=12, backend="numpy"):
+        super().__init__(objects, faraway, dtype, backend)
+        self.leaf_size = leaf_size
+        self.bins = bins
+        self.unbounded = self.pl_id
+
+        # achsenparallele Bounding Boxes, minimal aufgeblasen, damit flache Boxen (Dreiecke) nicht wegfallen
+        (a, u, v, c, r) = [x.astype(float) for x in (self.tri_a, self.tri_u, self.tri_v, self.sph_c, self.sph_r)]
+        ecken = np.stack([a, a + u, a + v])
+        lo = np.concatenate([c - r[:, None], ecken.min(axis=0)]) - 1e-7
+        hi = np.concatenate([c + r[:, None], ecken.max(axis=0)]) + 1e-7
+        self.prims = np.concatenate([self.sph_id, self.tri_id])
+
+        # Knoten als flache Arrays: Box, Split-Achse, Kinder (-1 = Blatt) bzw. Bereich in self.prims
+        self.node_lo, self.node_hi, self.axis = [], [], []
+        self.left, self.right, self.start, self.count = [], [], [], []
+        if len(self.prims):
+            order = self.build(lo, hi, (lo + hi) / 2, np.arange(len(self.prims)))
+            self.prims = self.prims[order]
+        self.node_lo = np.array(self.node_lo).reshape(-1, 3)
+        self.node_hi = np.array(self.node_hi).reshape(-1, 3)
+        (self.axis, self.left, self.right, self.start, self.count) = [np.array(a, dtype=int) for a in
+            (self.axis, self.left, self.right, self.start, self.count)]
+
+    def add_node(self, lo, hi):
+        self.node_lo.append(lo)
+        self.node_hi.append(hi)
+        for a in (self.axis, self.left, self.right, self.start, self.count):
+            a.append(-1)
+        return len(self.node_lo) - 1
+
+    # baut rekursiv den Teilbaum über die Primitive idx, gibt die neue Reihenfolge der Primitive zurück
+    def build(self, lo, hi, cent, idx, order=None):
+        if order is None:
+            order = []
+        node = self.add_node(lo[idx].min(axis=0), hi[idx].max(axis=0))
+        split = self.split(lo, hi, cent, idx)
+        if split is None: # Blatt
+            self.start[node] = len(order)
+            self.count[node] = len(idx)
+            order.extend(idx)
+            return order
+        (axis, links) = split
+        self.axis[node] = axis
+        self.left[node] = len(self.node_lo)
+        self.build(lo, hi, cent, idx[links], order)
+        self.right[node] = len(self.node_lo)
+        self.build(lo, hi, cent, idx[~links], order)
+        return order
+
+    # Surface Area Heuristic über self.bins gleich breite Bins der längsten Achse,
+    # gibt (Achse, Maske der linken Primitive) zurück oder None, wenn ein Blatt günstiger ist
+    def split(self, lo, hi, cent, idx):
+        n = len(idx)
+        if n <= self.leaf_size:
+            return None
+        c = cent[idx]
+        cmin, cmax = c.min(axis=0), c.max(axis=0)
+        axis = int(np.argmax(cmax - cmin))
+        ausdehnung = cmax[axis] - cmin[axis]
+        if ausdehnung <= 0: # alle Mittelpunkte gleich, nicht sinnvoll teilbar
+            return None
+
+        b = np.minimum(((c[:, axis] - cmin[axis]) / ausdehnung * self.bins).astype(int), self.bins - 1)
+        anzahl = np.bincount(b, minlength=self.bins)
+        blo = np.full((self.bins, 3), np.inf)
+        bhi = np.full((self.bins, 3), -np.inf)
+        np.minimum.at(blo, b, lo[idx])
+        np.maximum.at(bhi, b, hi[idx])
+
+        def flaeche(l, h):
+            e = np.maximum(h - l, 0)
+            return 2 * (e[:, 0] * e[:, 1] + e[:, 1] * e[:, 2] + e[:, 2] * e[:, 0])
+
+        # Split k: Bins [0, k] links, (k, bins) rechts
+        links_n = np.cumsum(anzahl)[:-1]
+        rechts_n = np.cumsum(anzahl[::-1])[::-1][1:]
+        links_a = flaeche(np.minimum.accumulate(blo)[:-1], np.maximum.accumulate(bhi)[:-1])
+        rechts_a = flaeche(np.minimum.accumulate(blo[::-1])[::-1][1:], np.maximum.accumulate(bhi[::-1])[::-1][1:])
+        kosten = np.where((links_n > 0) & (rechts_n > 0), links_a * links_n + rechts_a * rechts_n, np.inf)
+        k = int(np.argmin(kosten))
+        if np.isfinite(kosten[k]):
+            return (axis, b <= k)
+        # alles in einem Bin gelandet: am Median teilen
+        links = np.zeros(n, dtype=bool)
+        links[np.argsort(c[:, axis], kind="stable")[:n // 2]] = True
+        return (axis, links)
+
+    # nächster Treffer je Strahl: (Distanz, Index des Objekts in self.objects bzw. -1, Dreieck im Mesh bzw. 0)
+    def intersect(self, O, D):
+        (O, D) = self.rays(O, D)
+        (nearest, hit) = self.intersect_ids(self.unbounded, O, D)
+        if not len(self.node_lo):
+            return self.hits(nearest, hit)
+
+        O = tuple(np.broadcast_to(o, D[0].shape) for o in O)
+        with np.errstate(divide="ignore"):
+            inv = [1.0 / d for d in D]
+
+        stack = [(0, np.arange(len(nearest)))]
+        while stack:
+            (node, r) = stack.pop()
+            # Slab-Test je Achse; fmin/fmax ignorieren NaN aus 0 * inf (Ursprung genau auf der Box-Kante)
+            tmin = np.full(len(r), -np.inf)
+            tmax = np.full(len(r), np.inf)
+            for k in range(3):
+                (o, i) = (O[k][r], inv[k][r])
+                with np.errstate(invalid="ignore"):
+                    t0 = (self.node_lo[node, k] - o) * i
+                    t1 = (self.node_hi[node, k] - o) * i
+                tmin = np.fmax(tmin, np.fmin(t0, t1))
+                tmax = np.fmin(tmax, np.fmax(t0, t1))
+            r = r[(tmin <= tmax) & (tmax > 0) & (tmin < nearest[r])]
+            if not len(r):
+                continue
+            if self.left[node] < 0:
+                ids = self.prims[self.start[node]:self.start[node] + self.count[node]]
+                (t, h) = self.intersect_ids(ids, tuple(o[r] for o in O), tuple(d[r] for d in D))
+                naeher = t < nearest[r]
+                nearest[r[naeher]] = t[naeher]
+                hit[r[naeher]] = h[naeher]
+            elif D[self.axis[node]][r].sum() > 0: # linkes Kind liegt auf der Achse vorne, zuerst besuchen
+                stack.append((self.right[node], r))
+                stack.append((self.left[node], r))
+            else:
+                stack.append((self.left[node], r))
+                stack.append((self.right[node], r))
+        return self.hits(nearest, hit)
+
+    # Schattentest wie PackedScene.occluded, aber über den Baum: Boxen hinter maxdist fallen weg,
+    # und verdeckte Strahlen laufen nicht weiter durch die übrigen Knoten
+    def occluded(self, O, D, maxdist, skip=-1):
+        (O, D) = self.rays(O, D)
+        maxdist = np.asarray(maxdist, dtype=self.dtype)
+        skip = np.broadcast_to(skip, D[0].shape)
+        blocked = self.occluded_ids(self.unbounded, O, D, maxdist, skip)
+        if not len(self.node_lo):
+            return blocked
+
+        O = tuple(np.broadcast_to(o, D[0].shape) for o in O)
+        with np.errstate(divide="ignore"):
+            inv = [1.0 / d for d in D]
+
+        stack = [(0, np.flatnonzero(~blocked))]
+        while stack:
+            (node, r) = stack.pop()
+            r = r[~blocked[r]]
+            if not len(r):
+                continue
+            tmin = np.full(len(r), -np.inf)
+            tmax = np.full(len(r), np.inf)
+            for k in range(3):
+                (o, i) = (O[k][r], inv[k][r])
+                with np.errstate(invalid="ignore"):
+                    t0 = (self.node_lo[node, k] - o) * i
+                    t1 = (self.node_hi[node, k] - o) * i
+                tmin = np.fmax(tmin, np.fmin(t0, t1))
+                tmax = np.fmin(tmax, np.fmax(t0, t1))
+            r = r[(tmin <= tmax) & (tmax > 0) & (tmin < maxdist[r])]
+            if not len(r):
+                continue
+            if self.left[node] < 0:
+                ids = self.prims[self.start[node]:self.start[node] + self.count[node]]
+                b = self.occluded_ids(ids, tuple(o[r] for o in O), tuple(d[r] for d in D), maxdist[r], skip[r])
+                blocked[r[b]] = True
+            elif D[self.axis[node]][r].sum() > 0:
+                stack.append((self.right[node], r))
+                stack.append((self.left[node], r))
+            else:
+                stack.append((self.left[node], r))
+                stack.append((self.right[node], r))
+        return blocked
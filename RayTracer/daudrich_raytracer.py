@@ -28,84 +28,248 @@
  ******************************************************************************/
 """
 
-from functools import reduce
-import numbers
+from collections import OrderedDict, namedtuple
+import copy
+import ctypes
 import glfw
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 import numpy as np
 
+from vec3 import vec3, set_precision, empty
+from packed import PackedScene, nearest, triangle_kernel
+from backend import NUMPY
+from objreader import load_obj
+from lights import PointLight, AreaLight, light_samples
+from profiler import PROFILER, format_report, dump_json, dump_chrome_trace
+from bvh import BVH
+from tiles import render_tiles, tile_report, split_tiles
+from distributed import render_distributed
+from render_thread import RenderThread
 
-# -----------------------------------------------------------------------------------------------------------------------
 
-def extract(cond, x):
-    if isinstance(x, numbers.Number):
-        return x
-    else:
-        return np.extract(cond, x)
-
-class vec3():
-    def __init__(self, x, y, z):
-        (self.x, self.y, self.z) = (x, y, z)
-    def __mul__(self, other):
-        return vec3(self.x * other, self.y * other, self.z * other)
-    def __add__(self, other):
-        return vec3(self.x + other.x, self.y + other.y, self.z + other.z)
-    def __sub__(self, other):
-        return vec3(self.x - other.x, self.y - other.y, self.z - other.z)
-    def dot(self, other):
-        return (self.x * other.x) + (self.y * other.y) + (self.z * other.z)
-    def __abs__(self):
-        return self.dot(self)
-    def norm(self):
-        mag = np.sqrt(abs(self))
-        return self * (1.0 / np.where(mag == 0, 1, mag))
-    #cross added:
-    def cross(self,other):
-        a = ((self.y * other.z) - (self.z * other.y))
-        b = ((self.z * other.x) - (self.x * other.z))
-        c = ((self.x * other.y) - (self.y * other.x))
-        #return vec3(np.cross(self,other)) # was genau macht np.cross?
-        return vec3(a, b, c)
-    def components(self):
-        return (self.x, self.y, self.z)
-    def extract(self, cond):
-        return vec3(extract(cond, self.x),
-                    extract(cond, self.y),
-                    extract(cond, self.z))
-    def place(self, cond):
-        r = vec3(np.zeros(cond.shape), np.zeros(cond.shape), np.zeros(cond.shape))
-        np.place(r.x, cond, self.x)
-        np.place(r.y, cond, self.y)
-        np.place(r.z, cond, self.z)
-        return r
-rgb = vec3
+# -----------------------------------------------------------------------------------------------------------------------
 
 L = vec3(5, 5, -10)        # Point light position   
 E = vec3(0, 0.35, -1)       # Eye position
-FARAWAY = 1.0e39           # an implausibly huge distance
-
-def raytrace(O, D, scene, bounce = 0):
+FARAWAY = 1.0e30           # an implausibly huge distance (passt auch noch in float32)
+LIGHTS = [PointLight(L)]   # Standard-Lichtliste, siehe Scene.lights
+AMBIENT = 0.05
+MAX_BOUNCE = 2             # so oft wird höchstens reflektiert
+MIN_WEIGHT = 1 / 256       # Spiegelstrahlen, die weniger als das zur Pixelfarbe beitragen, werden nicht verfolgt
+ROULETTE_WEIGHT = 0.1      # Russian Roulette: schwächere Spiegelstrahlen überleben nur mit Wahrscheinlichkeit Gewicht / ROULETTE_WEIGHT
+
+# wie weit Spiegelungen verfolgt werden: höchstens max_bounce mal, nur solange das Gewicht eines Strahls
+# (Produkt der mirror-Werte auf seinem Weg) mindestens min_weight ist, ab Bounce roulette (0 = nie)
+# zusätzlich mit Russian Roulette
+Limits = namedtuple("Limits", "max_bounce min_weight roulette")
+
+def default_limits():
+    return Limits(MAX_BOUNCE, MIN_WEIGHT, 0)
+
+# nächster Treffer je Strahl: (Distanz, Index des getroffenen Objekts in scene bzw. -1, Dreieck im Mesh bzw. 0)
+# scene ist eine PackedScene/BVH oder die einfache Objektliste (brute force, zum Vergleichen)
+def nearest_hit(O, D, scene):
+    if isinstance(scene, PackedScene):
+        return scene.intersect(O, D)
+    distances = [] # Listen für die einzelnen Objekte
+    faces = []
+    for s in scene:
+        (d, f) = s.nearest_face(O, D) if s.kind == "mesh" else (s.intersect(O, D), 0)
+        distances.append(d)
+        faces.append(f)
+    nearest = distances[0]
+    for d in distances[1:]: # schaut bei den 4 Werten (weil 4 Objekte)(also Listen durch), welcher der kleinste ist - man will nur den nächsten Punkt an der Kamera
+        nearest = np.minimum(nearest, d)
+    hit = np.full(np.shape(nearest), -1)
+    face = np.full(np.shape(nearest), -1)
+    for (i, d) in reversed(list(enumerate(distances))): # bei gleicher Distanz gewinnt das erste Objekt
+        sel = (nearest != FARAWAY) & (d == nearest)
+        hit[sel] = i
+        face[sel] = np.broadcast_to(faces[i], np.shape(nearest))[sel]
+    return (nearest, hit, face)
+
+# Schattentest: True für Strahlen, die vor maxdist (Abstand zum Licht) etwas treffen.
+# Das Objekt mit Index skip (je Strahl oder für alle, z.B. das gerade schattierte) zählt nicht,
+# jeder Strahl hört beim ersten Treffer auf.
+def occluded(O, D, maxdist, scene, skip=-1):
+    if isinstance(scene, PackedScene):
+        return scene.occluded(O, D, maxdist, skip)
+    blocked = np.zeros(len(maxdist), dtype=bool)
+    skip = np.broadcast_to(skip, blocked.shape)
+    for (i, s) in enumerate(scene):
+        offen = np.flatnonzero(~blocked & (skip != i))
+        if not len(offen):
+            continue
+        blocked[offen] = s.intersect(O.take(offen), D.take(offen)) < maxdist[offen]
+    return blocked
+
+def raytrace(O, D, scene, bounce = 0, lights = LIGHTS, weight = 1.0, limits = None):
     # O is the ray origin, D is the normalized ray direction
-    # scene is a list of Sphere objects (see below)
+    # scene is a list of Sphere objects (see below) or a BVH over them
     # bounce is the number of the bounce, starting at zero for camera rays
-
-    distances = [s.intersect(O, D) for s in scene] # Listen für die einzelnen Objekte
-    nearest = reduce(np.minimum, distances) # schaut bei den 4 Werten (weil 4 Objekte)(also Listen durch), welcher der kleinste ist - man will nur den nächsten Punkt an der Kamera
-    color = rgb(0, 0, 0)
-    for (s, d) in zip(scene, distances): # zip verknüpft Objekte mit ihren Distanz-Listen
-        hit = (nearest != FARAWAY) & (d == nearest)
-        if np.any(hit):
-            dc = extract(hit, d)
-            Oc = O.extract(hit)
-            Dc = D.extract(hit)
-            cc = s.light(Oc, Dc, dc, scene, bounce)
-            color += cc.place(hit)
-    return color
+    # lights: Lichtquellen (PointLight, AreaLight)
+    # weight: Anteil je Strahl (oder für alle) an der Pixelfarbe, limits: siehe Limits
+
+    with PROFILER.stage("intersect", bounce, D.a.shape[1]):
+        (nearest, hitobj, face) = nearest_hit(O, D, scene)
+    return shade(O, D, nearest, hitobj, face, scene, bounce, lights, weight, limits)
+
+# Farbe je Strahl zu schon bekannten Treffern (aus nearest_hit), als Wavefront über die Bounces:
+# je Bounce werden die Treffer aller Objekte zusammen schattiert (ein Batch Schattenstrahlen je
+# Lichtprobe) und die Spiegelstrahlen aller Objekte in eine Warteschlange gesammelt, die dann als
+# ein Batch für den nächsten Bounce geschnitten wird. Zwischenergebnisse eines Bounces sind frei,
+# bevor der nächste beginnt. Am Ende werden die Farben von der tiefsten Stufe zurück
+# zusammengesetzt (Spiegelung * mirror, dann Glanz), in derselben Reihenfolge wie früher rekursiv.
+def shade(O, D, nearest, hitobj, face, scene, bounce = 0, lights = LIGHTS, weight = 1.0, limits = None):
+    limits = limits or default_limits()
+    stufen = []
+    while True:
+        (stufe, naechste) = shade_hits(O, D, nearest, hitobj, face, scene, bounce, lights, weight, limits)
+        stufen.append(stufe)
+        if naechste is None:
+            break
+        (O, D, weight) = naechste # Spiegelstrahlen aller Objekte
+        bounce += 1
+        with PROFILER.stage("intersect", bounce, D.a.shape[1]):
+            (nearest, hitobj, face) = nearest_hit(O, D, scene)
+
+    reflektiert = None
+    for (color, live, farbe, glanz, faktor, idx) in reversed(stufen):
+        bounce -= 1
+        if farbe is not None:
+            with PROFILER.stage("lighting", bounce + 1, 0):
+                if reflektiert is not None:
+                    r = (reflektiert * faktor).a # mirror = wie stark reflektiert es; dann addiert auf Farbe (aka dann neue Farbe)
+                    if len(idx) < len(live):
+                        farbe[:, idx] += r
+                    else:
+                        farbe += r
+                farbe += glanz # Spekularlicht wie in der Vorlesung
+                color[:, live] = farbe
+        reflektiert = vec3(color)
+    return reflektiert
+
+# ein Bounce der Wavefront: ((Farbspeicher (3, n), Strahlen mit Treffer, Farbe ohne Spiegelung und Glanz,
+# Glanz, mirror-Faktor und Index der gespiegelten Strahlen), (Ursprung, Richtung, Gewicht der Spiegelstrahlen) bzw. None)
+def shade_hits(O, D, nearest, hitobj, face, scene, bounce, lights, weight, limits):
+    color = empty((3, len(nearest))) # Farbspeicher einmal anlegen, Treffer werden per Index hineingeschrieben
+    color.fill(0)
+    live = np.flatnonzero(hitobj >= 0) # nur Strahlen mit Treffer weiterverfolgen
+    k = len(live)
+    if not k:
+        return ((color, live, None, None, None, None), None)
+    naechste = None
+    idx = None
+    faktor = None
+
+    with PROFILER.stage("material", bounce, k):
+        (D, obj, face) = (D.take(live), hitobj[live], face[live])
+        M = D * nearest[live]                   # intersection point        # Usprung + Distanz * Strahl
+        M += O.take(live)
+
+        # je Objekt: Normale, Farbe, Spiegelung und wer beim Schattentest übersprungen wird
+        N = vec3(empty((3, k)))
+        diffuse = empty((3, k))
+        mirror = np.empty(k)
+        skip = np.empty(k, dtype=int)
+        order = np.argsort(obj, kind="stable") # Objekt i bekommt order[grenzen[i]:grenzen[i + 1]]
+        grenzen = np.searchsorted(obj[order], np.arange(len(scene) + 1))
+        for (i, s) in enumerate(scene):
+            idx = order[grenzen[i]:grenzen[i + 1]]
+            if len(idx):
+                Mi = M.take(idx)
+                N.a[:, idx] = s.normal(Mi, D.take(idx), face[idx]).a
+                diffuse[:, idx] = s.diffusecolor(Mi).a
+                mirror[idx] = s.mirror
+                skip[idx] = -1 if s.self_shadowing else i
+
+        toO = (E - M).normalize()               # direction to ray origin   # Richtung zum Ursprung
+        nudged = N * .0001                      # M nudged to avoid itself  # damit er sich nicht selbst reflektiert, also sich nicht selbst nochmal schneidet (Strahl reflektiert an Objekt)
+        nudged += M
+
+    # eine Lichtprobe nach der anderen, alle Treffer auf einmal: so braucht der Schattentest nur
+    # Arrays für k Strahlen (einen Richtungspuffer für alle Proben), egal wie viele Proben es gibt;
+    # ohne Lichter bleibt es bei Ambient (und Spiegelungen)
+    (P, C) = light_samples(lights)
+    backend = getattr(scene, "backend", NUMPY)
+    (lambert, glanz) = (None, None)
+    toL = vec3(empty((3, k)))
+    for j in range(P.shape[1]):
+        with PROFILER.stage("shadow", bounce, k):
+            np.subtract(P[:, j:j + 1], M.a, out=toL.a) # direction to light # Richtung zum Licht
+            lichtabstand = np.sqrt(abs(toL))
+            toL.normalize()
+
+            # Shadow: find if the point is shadowed or not.
+            # This amounts to finding out if M can see the light
+            seelight = ~occluded(nudged, toL, lichtabstand, scene, skip) # Licht sichtbar, wenn bis zum Licht nichts (außer dem Objekt selbst) im Weg ist
+
+        with PROFILER.stage("lighting", bounce, k):
+            # Lambert (diffuse) und Blinn-Phong (specular) dieser Probe, vom Backend der Szene
+            (l, g) = backend.lighting(N, toO, toL, seelight, C[:, j:j + 1])
+            if lambert is None:
+                (lambert, glanz) = (l, g)
+            else:
+                lambert += l
+                glanz += g
+    if lambert is None:
+        (lambert, glanz) = (np.zeros((3, k)), np.zeros((3, k)))
+
+    farbe = diffuse * lambert
+
+    # Ambient
+    farbe += AMBIENT
+
+    # Reflection
+    if bounce < limits.max_bounce: # Spiegelungen nur bis zu dieser Tiefe verfolgen
+        # nur Strahlen, deren Spiegelung noch sichtbar beiträgt
+        gewicht = np.broadcast_to(weight, hitobj.shape)[live] * mirror
+        faktor = mirror
+        weiter = gewicht >= limits.min_weight
+        if limits.roulette and bounce + 1 >= limits.roulette:
+            # schwache Strahlen zufällig beenden, die überlebenden zählen entsprechend mehr (erwartungstreu);
+            # Zufallszahl aus dem Trefferpunkt, damit das Bild nicht von der Kachelaufteilung abhängt
+            p = np.minimum(gewicht / ROULETTE_WEIGHT, 1)
+            zufall = np.sin(M.x * 12.9898 + M.y * 78.233 + M.z * 37.719) * 43758.5453 % 1
+            weiter &= zufall < p
+            p[~weiter] = 1
+            (gewicht, faktor) = (gewicht / p, mirror / p)
+        idx = np.flatnonzero(weiter)
+        if len(idx):
+            with PROFILER.stage("reflection", bounce, len(idx)):
+                if len(idx) < k:
+                    (D, N, nudged, gewicht, faktor) = (D.take(idx), N.take(idx), nudged.take(idx), gewicht[idx], faktor[idx])
+                rayD = N * (-2 * D.dot(N))          # D - 2 (D . N) N, direkt im selben Array
+                rayD += D
+                rayD.normalize()
+                naechste = (nudged, rayD, gewicht)
+
+    return ((color, live, farbe, glanz, faktor, idx), naechste)
+
+
+# Pixel mit starkem Kontrast zu einem Nachbarn in der Farbe (bild, Werte 0..255); an der Grenze zwischen
+# zwei Objekten (ids) reicht der halbe Farbunterschied, ein Objektwechsel ohne sichtbaren Unterschied
+# (z.B. zwei gleich helle Flächen) zählt nicht. Markiert werden beide Seiten der Kante.
+def edge_pixels(bild, ids, schwelle):
+    markiert = np.zeros(ids.shape, dtype=bool)
+    for achse in (0, 1):
+        unterschied = np.abs(np.diff(bild, axis=achse)).max(axis=-1)
+        kante = (unterschied > schwelle) | ((np.diff(ids, axis=achse) != 0) & (unterschied > schwelle / 2))
+        if achse == 0:
+            markiert[1:] |= kante
+            markiert[:-1] |= kante
+        else:
+            markiert[:, 1:] |= kante
+            markiert[:, :-1] |= kante
+    return markiert
 
 
 class Sphere:
+    kind = "sphere"     # Array-Block in der PackedScene
+    self_shadowing = False
+
     def __init__(self, center, r, diffuse, mirror = 0.5):
         self.c = center
         self.r = r
@@ -126,46 +290,24 @@ class Sphere:
     def diffusecolor(self, M):
         return self.diffuse
 
-    def light(self, O, D, d, scene, bounce):
-        M = (O + D * d)                         # intersection point        # Usprung + Distanz * Strahl
-        N = (M - self.c) * (1. / self.r)        # normal
-        toL = (L - M).norm()                    # direction to light        # Richtung zum Licht
-        toO = (E - M).norm()                    # direction to ray origin   # Richtung zum Ursprung
-        nudged = M + N * .0001                  # M nudged to avoid itself  # damit er sich nicht selbst reflektiert, also sich nicht selbst nochmal schneidet (Strahl reflektiert an Objekt)
-
-        # Shadow: find if the point is shadowed or not.
-        # This amounts to finding out if M can see the light
-        light_distances = [s.intersect(nudged, toL) for s in scene]
-        light_nearest = reduce(np.minimum, light_distances)
-        seelight = light_distances[scene.index(self)] == light_nearest # self = Objekt (z.B. Kugel), vergleicht, ob eigene Distanzen die nähsten sind??
-
-        # Ambient
-        color = rgb(0.05, 0.05, 0.05)
-
-        # Lambert shading (diffuse)
-        lv = np.maximum(N.dot(toL), 0)
-        color += self.diffusecolor(M) * lv * seelight
-
-        # Reflection
-        if bounce < 2: # nur 1x reflektieren
-            rayD = (D - N * 2 * D.dot(N)).norm()
-            color += raytrace(nudged, rayD, scene, bounce + 1) * self.mirror # mirror = wie stark reflektiert es; dann addiert auf Farbe (aka dann neue Farbe)
-
-        # Blinn-Phong shading (specular) # Spekularlicht wie in der Vorlesung
-        phong = N.dot((toL + toO).norm())
-        color += rgb(1, 1, 1) * np.power(np.clip(phong, 0, 1), 50) * seelight
-        return color
+    def normal(self, M, D, face):
+        N = M - self.c
+        N *= (1. / self.r)
+        return N
 
     # Methode zum Drehen der Sphere
     def rotate(self, winkel):
         drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
-        punktAlsArray = np.array([self.c.x, self.c.y, self.c.z]).T # Mittelpunkt der Sphere als np Array umwandeln
+        punktAlsArray = np.ravel([self.c.x, self.c.y, self.c.z]) # Mittelpunkt der Sphere als np Array umwandeln
         gedrehterPunkt = drehmatrix.dot(punktAlsArray) # Drehmatrix auf den Punkt anwenden
         gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
         self.c = gedrehterPunktAlsVec # Mittelpunkt der Sphere neu setzen
 
 
 class Triangle:
+    kind = "triangle"
+    self_shadowing = False
+
     def __init__(self, posA, posB, posC, diffuse, mirror = 0.5):
         self.posA = posA
         self.posB = posB
@@ -178,70 +320,50 @@ class Triangle:
         u = self.posB - self.posA
         v = self.posC - self.posA
         w = O - self.posA
+        p = D.cross(v) # nur einmal, nicht für t, r und s jeweils neu
 
-        t = 1 / (D.cross(v).dot(u)) * (w.cross(u).dot(v))
-        r = 1 / (D.cross(v).dot(u)) * (D.cross(v).dot(w))
-        s = 1 / (D.cross(v).dot(u)) * (w.cross(u).dot(D))
+        t = 1 / (p.dot(u)) * (w.cross(u).dot(v))
+        r = 1 / (p.dot(u)) * (p.dot(w))
+        s = 1 / (p.dot(u)) * (w.cross(u).dot(D))
 
-        pred = (r >= 0) & (r <= 1) & (s >= 0) & (s <= 1) & (r + s <= 1) # nimmt nur Werte auf, an denen r,s zwischen 0,1 sind und r+s kleiner gleich 1
+        pred = (r >= 0) & (r <= 1) & (s >= 0) & (s <= 1) & (r + s <= 1) & (t > 0) # nimmt nur Werte auf, an denen r,s zwischen 0,1 sind und r+s kleiner gleich 1 (und nur vor dem Ursprung, wie bei Sphere und Plane)
         return np.where(pred, t, FARAWAY) # setzt Faraway Wert, wenn kein Schnittpunkt
 
     def diffusecolor(self, M):
         return self.diffuse
 
-    def light(self, O, D, d, scene, bounce):
-        M = (O + D * d)                         # intersection point        # Usprung + Distanz * Strahl
-        N = self.posA.cross(self.posB)          # normal
-        toL = (L - M).norm()                    # direction to light        # Richtung zum Licht
-        toO = (E - M).norm()                    # direction to ray origin   # Richtung zum Ursprung
-        nudged = M + N * .0001                  # M nudged to avoid itself  # damit er sich nicht selbst reflektiert, also sich nicht selbst nochmal schneidet (Strahl reflektiert an Objekt)
-
-        # Shadow: find if the point is shadowed or not.
-        # This amounts to finding out if M can see the light
-        light_distances = [s.intersect(nudged, toL) for s in scene]
-        light_nearest = reduce(np.minimum, light_distances)
-        seelight = light_distances[scene.index(self)] == light_nearest # self = Objekt (z.B. Kugel), vergleicht, ob eigene Distanzen die nähsten sind??
-
-        # Ambient
-        color = rgb(0.05, 0.05, 0.05)
-
-        # Lambert shading (diffuse)
-        lv = np.maximum(N.dot(toL), 0)
-        color += self.diffusecolor(M) * lv * seelight
-
-        # Reflection
-        if bounce < 2: # nur 1x reflektieren
-            rayD = (D - N * 2 * D.dot(N)).norm()
-            color += raytrace(nudged, rayD, scene, bounce + 1) * self.mirror # mirror = wie stark reflektiert es; dann addiert auf Farbe (aka dann neue Farbe)
-
-        # Blinn-Phong shading (specular) # Spekularlicht wie in der Vorlesung
-        phong = N.dot((toL + toO).norm())
-        color += rgb(1, 1, 1) * np.power(np.clip(phong, 0, 1), 50) * seelight
-        return color
+    # Normale der Dreiecksebene, zur Seite des Strahls gedreht (das Dreieck ist beidseitig)
+    def normal(self, M, D, face):
+        N = (self.posB - self.posA).cross(self.posC - self.posA).normalize()
+        N = N * np.where(D.dot(N) > 0, -1., 1.)
+        return N
 
     # Methode zum Drehen des Dreiecks (rotate von Sphere, aber auf jeden Punkt anwenden (also 3x))
     def rotate(self, winkel):
         # Punkt A:
         drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
-        punktAlsArray = np.array([self.posA.x, self.posA.y, self.posA.z]).T # Punkt A als np Array umwandeln
+        punktAlsArray = np.ravel([self.posA.x, self.posA.y, self.posA.z]) # Punkt A als np Array umwandeln
         gedrehterPunkt = drehmatrix @ punktAlsArray # Drehmatrix auf den Punkt anwenden
         gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
         self.posA = gedrehterPunktAlsVec # Punkt A neu setzen
         # Punkt B:
         drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
-        punktAlsArray = np.array([self.posB.x, self.posB.y, self.posB.z]).T # Punkt B als np Array umwandeln
+        punktAlsArray = np.ravel([self.posB.x, self.posB.y, self.posB.z]) # Punkt B als np Array umwandeln
         gedrehterPunkt = drehmatrix.dot(punktAlsArray) # Drehmatrix auf den Punkt anwenden
         gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
         self.posB = gedrehterPunktAlsVec # Punkt B neu setzen
         # Punkt C:
         drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
-        punktAlsArray = np.array([self.posC.x, self.posC.y, self.posC.z]).T # Punkt C als np Array umwandeln
+        punktAlsArray = np.ravel([self.posC.x, self.posC.y, self.posC.z]) # Punkt C als np Array umwandeln
         gedrehterPunkt = drehmatrix.dot(punktAlsArray) # Drehmatrix auf den Punkt anwenden
         gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
         self.posC = gedrehterPunktAlsVec # Punkt C neu setzen
 
 
 class Plane:
+    kind = "plane"
+    self_shadowing = False
+
     def __init__(self, center, normal, diffuse, mirror=0.05):
         self.c = center
         self.n = normal
@@ -257,47 +379,85 @@ class Plane:
         checker = ((M.x * 2).astype(int) % 2) == ((M.z * 2).astype(int) % 2)
         return self.diffuse * checker
 
-    def light(self, O, D, d, scene, bounce):
-        M = (O + D * d)                         # intersection point        # Usprung + Distanz * Strahl
-        N = self.n                              # normal
-        toL = (L - M).norm()                    # direction to light        # Richtung zum Licht
-        toO = (E - M).norm()                    # direction to ray origin   # Richtung zum Ursprung
-        nudged = M + N * .0001                  # M nudged to avoid itself  # damit er sich nicht selbst reflektiert, also sich nicht selbst nochmal schneidet (Strahl reflektiert an Objekt)
+    def normal(self, M, D, face):
+        return self.n
 
-        # Shadow: find if the point is shadowed or not.
-        # This amounts to finding out if M can see the light
-        light_distances = [s.intersect(nudged, toL) for s in scene]
-        light_nearest = reduce(np.minimum, light_distances)
-        seelight = light_distances[scene.index(self)] == light_nearest # self = Objekt (z.B. Kugel), vergleicht, ob eigene Distanzen die nähsten sind??
+    # Methode zum Drehen der Plane (rotate von Sphere basically)
+    def rotate(self, winkel):
+        drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
+        punktAlsArray = np.ravel([self.c.x, self.c.y, self.c.z]) # Mittelpunkt der Plane als np Array umwandeln
+        gedrehterPunkt = drehmatrix.dot(punktAlsArray) # Drehmatrix auf den Punkt anwenden
+        gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
+        self.c = gedrehterPunktAlsVec # Mittelpunkt der Plane neu setzen
 
-        # Ambient
-        color = rgb(0.05, 0.05, 0.05)
 
-        # Lambert shading (diffuse)
-        lv = np.maximum(N.dot(toL), 0)
-        color += self.diffusecolor(M) * lv * seelight
+class Mesh:
+    kind = "mesh"       # landet Dreieck für Dreieck im Triangle-Block der PackedScene
+    self_shadowing = True # anders als Kugeln kann ein Mesh sich selbst verdecken
 
-        # Reflection
-        if bounce < 2: # nur 1x reflektieren
-            rayD = (D - N * 2 * D.dot(N)).norm()
-            color += raytrace(nudged, rayD, scene, bounce + 1) * self.mirror # mirror = wie stark reflektiert es; dann addiert auf Farbe (aka dann neue Farbe)
+    # punkte (n, 3), dreiecke (m, 3) Indizes in punkte
+    def __init__(self, punkte, dreiecke, diffuse, mirror = 0.2):
+        self.punkte = np.asarray(punkte, dtype=float)
+        self.faces = np.asarray(dreiecke, dtype=int)
+        self.diffuse = diffuse
+        self.mirror = mirror
+        self.precompute()
+
+    # Modell aus einer OBJ-Datei, so skaliert, dass die längste Seite der Bounding Box groesse lang ist,
+    # und so verschoben, dass die Mitte seiner Unterseite auf boden (vec3) steht
+    @staticmethod
+    def from_obj(path, boden, groesse, diffuse, mirror = 0.2):
+        (punkte, dreiecke) = load_obj(path)
+        (lo, hi) = (punkte.min(axis=0), punkte.max(axis=0))
+        skala = groesse / (hi - lo).max()
+        unten = np.array([(lo[0] + hi[0]) / 2, lo[1], (lo[2] + hi[2]) / 2])
+        return Mesh((punkte - unten) * skala + np.ravel(boden.components()), dreiecke, diffuse, mirror)
+
+    # Eckpunkt A, Kanten u, v und Normale je Dreieck, einmal für alle Strahlen
+    def precompute(self):
+        ecken = self.punkte[self.faces]
+        self.a = ecken[:, 0]
+        self.u = ecken[:, 1] - self.a
+        self.v = ecken[:, 2] - self.a
+        n = np.cross(self.u, self.v)
+        laenge = np.linalg.norm(n, axis=1)
+        laenge[laenge == 0] = 1
+        self.normals = empty((3, len(n))) # (3, m), Spalte je Dreieck, in der Genauigkeit der Strahlen
+        self.normals[...] = (n / laenge[:, None]).T
+
+    # Möller-Trumbore über alle Dreiecke auf einmal: (Distanz, Dreieck) des nächsten Treffers je Strahl
+    def nearest_face(self, O, D):
+        O = tuple(np.squeeze(c) for c in O.components())
+        D = tuple(np.ravel(c) for c in D.components())
+        (t, face) = nearest(triangle_kernel, (self.a, self.u, self.v), O, D, FARAWAY)
+        return (t, face)
 
-        # Blinn-Phong shading (specular) # Spekularlicht wie in der Vorlesung
-        phong = N.dot((toL + toO).norm())
-        color += rgb(1, 1, 1) * np.power(np.clip(phong, 0, 1), 50) * seelight
-        return color
+    def intersect(self, O, D):
+        return self.nearest_face(O, D)[0]
 
-    # Methode zum Drehen der Plane (rotate von Sphere basically)
+    def diffusecolor(self, M):
+        return self.diffuse
+
+    # Normale des getroffenen Dreiecks, zur Seite des Strahls gedreht (Dreiecke sind beidseitig)
+    def normal(self, M, D, face):
+        N = vec3(np.take(self.normals, face, axis=1, out=empty((3, len(face)))))
+        N *= np.where(D.dot(N) > 0, -1., 1.)
+        return N
+
+    # Drehen um die y-Achse wie bei Sphere, nur für alle Punkte auf einmal
     def rotate(self, winkel):
         drehmatrix = np.array([[np.cos(winkel), 0, -np.sin(winkel)], [0, 1, 0], [np.sin(winkel), 0, np.cos(winkel)]]) # Drehung um y-Achse
-        punktAlsArray = np.array([self.c.x, self.c.y, self.c.z]).T # Mittelpunkt der Plane als np Array umwandeln
-        gedrehterPunkt = drehmatrix.dot(punktAlsArray) # Drehmatrix auf den Punkt anwenden
-        gedrehterPunktAlsVec = vec3(gedrehterPunkt[0], gedrehterPunkt[1], gedrehterPunkt[2]) # Punkt wieder zum vec wandeln
-        self.c = gedrehterPunktAlsVec # Mittelpunkt der Plane neu setzen
+        self.punkte = self.punkte @ drehmatrix.T
+        self.precompute()
 
 # -----------------------------------------------------------------------------------------------------------------------
 
 
+# raytrace_image(abbrechen=...) hat aufgehört, weil die Ansicht veraltet ist
+class RenderCancelled(Exception):
+    pass
+
+
 class Scene:
     """
         OpenGL 2D scene class that render a textured quad.
@@ -311,8 +471,37 @@ class Scene:
         self.width = width
         self.height = height
         self.texture_id = None
+        self.pbo = None         # zwei Pixel Buffer Objects zum Hochladen der Bilder, siehe upload()
+        self.pbo_next = 0
+        self.gezeigt = 0        # Nummer des zuletzt gezeigten Bildes vom Render-Thread
         self.anzahlPos = 0
         self.anzahlNeg = 0
+        self.precision = np.float64 # np.float32: halber Speicher für alle Strahl-Arrays
+        self.model = None       # Pfad zu einer OBJ-Datei (z.B. ../oglViewer/models/bunny.obj), steht dann als Mesh vor den Kugeln
+        self.lights = list(LIGHTS) # PointLight/AreaLight, bei Änderung version hochzählen
+        self.backend = "numpy"  # Rechenkerne: "numpy" (Referenz), "numba" (kompiliert, parallel) oder "auto", siehe backend.py
+        self.accel = "bvh"      # "packed": alle Primitive eines Typs auf einmal, "list": alle Objekte wie früher einzeln (brute force, z.B. für Pixelvergleich)
+        self.workers = 1        # > 1: Bild in Kacheln auf so vielen Prozessen rendern (z.B. os.cpu_count())
+        self.tile_size = 64     # Kantenlänge der Kacheln in Pixeln
+        self.nodes = []         # Adressen von Render-Knoten ("host:port" oder Unix-Socket, siehe distributed.py), rendern dann alle Kacheln
+        self.node_timeout = 60.0 # Sekunden ohne Antwort, nach denen ein Render-Knoten als ausgefallen gilt (Kacheln an die anderen)
+        self.tile_times = []    # je Kachel ((x0, y0, x1, y1), Sekunden, pid) vom letzten Bild, siehe tile_report()
+        self.max_bounce = MAX_BOUNCE # so oft wird höchstens reflektiert (wie min_weight und roulette: bei Änderung version hochzählen)
+        self.min_weight = MIN_WEIGHT # Spiegelstrahlen mit kleinerem Anteil an der Pixelfarbe werden nicht verfolgt (0 = alle)
+        self.roulette = 0       # > 0: ab diesem Bounce schwache Spiegelstrahlen per Russian Roulette beenden (für große max_bounce)
+        self.antialias = 0      # n > 1: an Kanten n x n zusätzliche Strahlen je Pixel (geschichtet), sonst 1 Strahl je Pixel
+        self.aa_schwelle = 0.1  # Farbunterschied zum Nachbarpixel (Anteil von 0..1 je Kanal), ab dem ein Pixel als Kante gilt
+        self.progressive = True # erst grob (jedes 8. Pixel), dann feiner, solange sich die Ansicht nicht ändert
+        self.stufen = (8, 4, 2, 1)
+        self.version = 0        # hochzählen, wenn sich die Szene selbst ändert (Objekte, Material, accel, ...)
+        self.basis = None       # (Schlüssel, Objekte, BVH/PackedScene bzw. None ungedreht, {Winkel: gedrehte Szene}), siehe build_scene()
+        self.cache = OrderedDict() # fertige Bilder je Schlüssel, LRU
+        self.cache_size = 16
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.profile = False    # True: raytrace_image misst Zeit, Strahlen und Speicher je Stufe, siehe profile_report()
+        self.profile_memory = True # beim Messen auch Speicher (tracemalloc, macht es etwas langsamer)
+        self.profile_data = None
 
 
     def set_size(self, width, height):
@@ -340,16 +529,44 @@ class Scene:
         glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, w, h, 0, GL_RGB, GL_UNSIGNED_BYTE, image_data)
 
 
-    def update_img(self, image_data):
-        # update texture by replace the image data of the texture object
-        # using glTextSubImage2D(...) 
+    # Bild (uint8, Form (width, height, 3)) über abwechselnd eines von zwei Pixel Buffer Objects in die
+    # Textur laden: die Kopie in den Puffer ist nur ein memmove, die Übertragung in die Textur macht der
+    # Treiber asynchron. Ohne PBO-Unterstützung direkt mit glTexSubImage2D.
+    def upload(self, image_data):
         w, h, d = image_data.shape
-        image_data = image_data.reshape((w * h, d))
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        if self.pbo is None:
+            self.pbo = list(np.ravel(glGenBuffers(2))) if bool(glGenBuffers) else []
+        if not self.pbo:
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, GL_RGB, GL_UNSIGNED_BYTE, image_data.reshape((w * h, d)))
+            return
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.pbo[self.pbo_next])
+        self.pbo_next = 1 - self.pbo_next
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, image_data.nbytes, None, GL_STREAM_DRAW) # alten Inhalt verwerfen, nicht warten
+        ziel = glMapBuffer(GL_PIXEL_UNPACK_BUFFER, GL_WRITE_ONLY)
+        if ziel:
+            ctypes.memmove(ziel, np.ascontiguousarray(image_data).ctypes.data, image_data.nbytes)
+            glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, GL_RGB, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+
+    # zeigt das neueste Bild des Render-Threads (frames, ein FrameBuffer), hochgeladen wird nur ein neues
+    def show(self, frames):
+        if not self.texture_id:
+            self.initialize_image()
+
+        def upload(bild, ansicht):
+            if bild.shape[:2] == (self.width, self.height): # Bild von vor einer Größenänderung: nicht zeigen
+                self.upload(bild)
+        self.gezeigt = frames.read(self.gezeigt, upload)
+        self.draw_img()
+
 
+    # draw textured rectangle
+    def draw_img(self):
         glEnable(GL_TEXTURE_2D)
         glBindTexture(GL_TEXTURE_2D, self.texture_id)
-        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, GL_RGB, GL_UNSIGNED_BYTE, image_data)
-        # draw textured rectangle
         glBegin(GL_TRIANGLE_STRIP)
         for vt in np.array([(0, 0), (0, 1), (1, 0), (1, 1)]):
             glTexCoord2fv(vt)
@@ -358,13 +575,36 @@ class Scene:
         glDisable(GL_TEXTURE_2D)
 
 
-    def render(self):
-        # if no texture_id is available (first call of render) initialize
-        if not self.texture_id:
-            self.initialize_image()
-        else:
-            image = self.raytrace_image()
-            self.update_img(image)
+    # alles, wovon das Bild abhängt: (Drehung, Breite, Höhe, Antialiasing, Version)
+    def view_key(self):
+        return (self.anzahlPos - self.anzahlNeg, self.width, self.height, self.antialias, self.version)
+
+
+    # für den Render-Thread: alle Stufen der aktuellen Ansicht als uint8-Bilder, von grob nach fein
+    # (bzw. das fertige Bild aus dem Cache). abbrechen() wird zwischen Stufen und Streifen gefragt,
+    # bei True endet das Rendern mit RenderCancelled.
+    def render_stages(self, abbrechen=None):
+        ansicht = self.view_key()
+        bild = self.cache.get(ansicht)
+        if bild is not None:
+            self.cache.move_to_end(ansicht)
+            self.cache_hits += 1
+            yield bild
+            return
+        self.cache_misses += 1
+        for faktor in (self.stufen if self.progressive else (1,)):
+            if abbrechen and abbrechen():
+                raise RenderCancelled()
+            bild = self.raytrace_image(faktor, abbrechen)
+            yield bild
+        self.cache_put(ansicht, bild)
+
+
+    # speichert ein fertiges Bild (als uint8, so landet es ohnehin in der Textur), verdrängt das älteste
+    def cache_put(self, ansicht, bild):
+        self.cache[ansicht] = bild.astype(np.uint8)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
         
 
     # musste in Ihrem Code rumpfuschen, wusste nicht wie ich das Rotieren sonst umsetzen soll ^^"
@@ -375,11 +615,97 @@ class Scene:
         self.anzahlNeg = self.anzahlNeg + anzahl
 
 
-    def raytrace_image(self, start=True):
+    def raytrace_image(self, faktor=1, abbrechen=None, out=None):
         # generate a raytraced color image of size (self.width, self.height) .....
-        from time import sleep
-        sleep(.2)
-        
+        # faktor > 1: nur jedes faktor-te Pixel je Richtung rendern und hochskalieren (Vorschau)
+        # abbrechen: Funktion, die zwischen den Kacheln gefragt wird, True = RenderCancelled
+        # out: Array (height, width, 3), z.B. ein np.memmap aus framebuffer.open_image(), in das Kachel für
+        # Kachel geschrieben wird (uint8: abgeschnitten wie astype), so hängt der Speicherbedarf nur von
+        # tile_size ab und nicht von der Auflösung; zurückgegeben wird dann out selbst
+        from time import perf_counter
+
+        if self.profile:
+            PROFILER.start(self.profile_memory)
+        try:
+            with PROFILER.stage("frame", 0, self.width * self.height):
+                if faktor > 1:
+                    (w, h) = (-(-self.width // faktor), -(-self.height // faktor))
+                    image = self.raytrace_tile(0, 0, w, h, w, h, antialias=0)
+                    with PROFILER.stage("upscale"):
+                        image = np.repeat(np.repeat(image, faktor, axis=0), faktor, axis=1)[:self.height, :self.width]
+                elif self.nodes:
+                    start = perf_counter()
+                    image = np.empty((self.height, self.width, 3)) if out is None else out
+                    with PROFILER.stage("tiles", 0, self.width * self.height):
+                        self.tile_times = render_distributed(self, image, self.nodes, self.tile_size, self.node_timeout)
+                    self.tile_wall = perf_counter() - start
+                elif self.workers > 1:
+                    start = perf_counter()
+                    image = np.empty((self.height, self.width, 3)) if out is None else out
+                    with PROFILER.stage("tiles", 0, self.width * self.height): # in den Worker-Prozessen wird nicht gemessen
+                        self.tile_times = render_tiles(self, image, self.workers, self.tile_size)
+                    self.tile_wall = perf_counter() - start
+                elif abbrechen is not None or out is not None:
+                    image = np.empty((self.height, self.width, 3)) if out is None else out
+                    for (x0, y0, x1, y1) in split_tiles(self.width, self.height, self.tile_size):
+                        if abbrechen is not None and abbrechen():
+                            raise RenderCancelled()
+                        image[y0:y1, x0:x1] = self.raytrace_tile(x0, y0, x1, y1)
+                        if x1 == self.width and isinstance(image, np.memmap): # Kachelzeile fertig, schon lesbar
+                            image.flush()
+                else:
+                    image = self.raytrace_tile(0, 0, self.width, self.height)
+        finally:
+            if self.profile:
+                PROFILER.stop()
+                self.profile_data = PROFILER.report()
+        if out is not None:
+            if image is not out: # Vorschau
+                out[...] = image
+            if isinstance(out, np.memmap):
+                out.flush()
+            return out
+        # image = np.random.randint(0, 255, (self.width, self.height, 3)) # von Schwani
+        return image.reshape(self.width, self.height, 3)
+
+
+    # Messung vom letzten Bild (nur mit self.profile): {"stages": Summen je (Stufe, Bounce), "events": einzelne Messungen}
+    def profile_report(self):
+        return self.profile_data
+
+    # als Text bzw. als Datei, format "json" oder "chrome" (für chrome://tracing / Perfetto)
+    def format_profile(self):
+        return format_report(self.profile_data) if self.profile_data else "keine Messung (Scene.profile = True setzen)"
+
+    def dump_profile(self, path, format="json"):
+        (dump_chrome_trace if format == "chrome" else dump_json)(self.profile_data, path)
+
+
+    # Zusammenfassung der Kachelzeiten vom letzten Bild (nur bei workers > 1 oder nodes)
+    def tile_report(self):
+        return tile_report(self.tile_times, getattr(self, "tile_wall", 0))
+
+
+    # Pickle für die Kachel-Prozesse und Render-Knoten ohne die aufgebaute Szene (die baut jeder Prozess
+    # selbst), ohne Bilder (Cache) und ohne Messwerte vom letzten Bild, so bleibt es klein
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["basis"] = None
+        state["cache"] = OrderedDict()
+        state["tile_times"] = []
+        state["tile_wall"] = 0
+        state["profile_data"] = None
+        return state
+
+    # flache Kopie (z.B. für den Render-Thread): teilt Cache und aufgebaute Szene mit dem Original
+    def __copy__(self):
+        kopie = object.__new__(type(self))
+        kopie.__dict__.update(self.__dict__)
+        return kopie
+
+
+    # Objekte der Szene, ungedreht
+    def scene_objects(self):
         scene = [
             Plane(vec3(0, -1, 0), vec3(0, 1, 0), vec3(1, 1, 1)),
             Triangle(vec3(-0.5, .3, 1.2), vec3(0.5, .3, 1.2), vec3(0, 1.2, 1.2), vec3(1, 1, 0)),
@@ -387,33 +713,99 @@ class Scene:
             Sphere(vec3(0.5, .3, 1.2), .4, vec3(1, 0, 0)), # rechts
             Sphere(vec3(0, 1.2, 1.2), .4, vec3(0, 0, 1)) # oben
             ]
-        
+        if self.model:
+            scene.append(Mesh.from_obj(self.model, vec3(0, -1, 0.7), .7, vec3(.9, .8, .6)))
+        return scene
+
+
+    # Szene in der aktuellen Drehung, je nach self.accel als BVH, PackedScene oder einfache Liste.
+    # Objekte und BVH/PackedScene werden nur einmal aufgebaut (neu erst bei anderem Modell, accel,
+    # Genauigkeit, Backend oder Version). Die Drehung um (anzahlPos - anzahlNeg) * pi/10 wird einmal
+    # je Winkel auf Kopien der Objekte angewendet (die BVH dreht stattdessen die Strahlen zurück) und
+    # bleibt in self.basis, so drehen die Kacheln eines Bildes nicht jede für sich neu.
+    def build_scene(self):
+        key = (self.model, self.accel, self.precision, self.backend, self.version)
+        if self.basis is None or self.basis[0] != key:
+            objekte = self.scene_objects()
+            if self.accel == "bvh":
+                beschleunigt = BVH(objekte, FARAWAY, self.precision, backend=self.backend)
+            elif self.accel == "packed":
+                beschleunigt = PackedScene(objekte, FARAWAY, self.precision, self.backend)
+            else:
+                beschleunigt = None
+            self.basis = (key, objekte, beschleunigt, {})
+        (key, objekte, beschleunigt, gedreht) = self.basis
+
         # Rotierung:
-        for i in range(self.anzahlPos): # durchläuft entsprechend der Pos-Drehungs-Anzahl
-            winkel = np.pi / 10
-            for obj in scene:
-            #print(obj.c.x, obj.c.y, obj.c.z)
-                obj.rotate(winkel)
-        for i in range(self.anzahlNeg): # durchläuft entsprechend der Neg-Drehungs-Anzahl
-            winkel = -(np.pi / 10)
-            for obj in scene:
-                obj.rotate(winkel)
+        winkel = (self.anzahlPos - self.anzahlNeg) * np.pi / 10
+        if winkel not in gedreht:
+            if winkel != 0:
+                objekte = [copy.copy(obj) for obj in objekte] # rotate() setzt neue Attribute, das Original bleibt
+                for obj in objekte:
+                    obj.rotate(winkel)
+            gedreht.clear() # nur die letzte Drehung behalten
+            gedreht[winkel] = objekte if beschleunigt is None else beschleunigt.rotated(winkel, objekte)
+        return gedreht[winkel]
+
+
+    # rendert den Ausschnitt [x0, x1) x [y0, y1) eines Rasters von width x height Pixeln
+    # (Standard: self.width x self.height) über den Bildschirmausschnitt,
+    # Ergebnis hat die Form (y1 - y0, x1 - x0, 3) mit Werten 0..255.
+    # antialias (Standard: self.antialias) > 1: Kantenpixel in einem zweiten Durchgang mit
+    # antialias x antialias geschichteten Strahlen je Pixel neu berechnen (Mittelwert)
+    def raytrace_tile(self, x0, y0, x1, y1, width=None, height=None, antialias=None):
+        set_precision(self.precision)
+        with PROFILER.stage("build_scene"):
+            scene = self.build_scene()
+        (width, height) = (width or self.width, height or self.height)
+        n = self.antialias if antialias is None else antialias
+        # mit Antialiasing einen Rand von 1 Pixel mitrechnen, damit Kanten an der Kachelgrenze auch gefunden werden
+        rand = 1 if n > 1 else 0
+        (ax0, ay0, ax1, ay1) = (max(x0 - rand, 0), max(y0 - rand, 0), min(x1 + rand, width), min(y1 + rand, height))
 
         r = float(self.width) / self.height
         # Screen coordinates: x0, y0, x1, y1.
         S = (-1, 1 / r + .25, 1, -1 / r + .25)
-        x = np.tile(np.linspace(S[0], S[2], self.width), self.height)
-        y = np.repeat(np.linspace(S[1], S[3], self.height), self.width)
-
-        Q = vec3(x, y, 0)
-        color = raytrace(E, (Q - E).norm(), scene)
-
-        #rgb = [Image.fromarray((255 * np.clip(c, 0, 1).reshape((self.height, self.width))).astype(np.uint8), "L") for c in color.components()] # von rt3.py
-        rgb = [(255 * np.clip(c, 0, 1)) for c in color.components()]
-        # image = np.random.randint(0, 255, (self.width, self.height, 3)) # von Schwani
-        image = np.array(rgb).T.reshape(self.width, self.height, 3)
-
-        return image
+        x = np.tile(np.linspace(S[0], S[2], width)[ax0:ax1], ay1 - ay0)
+        y = np.repeat(np.linspace(S[1], S[3], height)[ay0:ay1], ax1 - ax0)
+        (bild, ids) = self.trace_pixels(scene, x, y)
+        bild = bild.reshape(ay1 - ay0, ax1 - ax0, 3)
+
+        if n > 1:
+            kanten = edge_pixels(bild, ids.reshape(bild.shape[:2]), 255 * self.aa_schwelle)
+            kanten[:y0 - ay0] = kanten[y1 - ay0:] = False # Rand nur zum Vergleichen
+            kanten[:, :x0 - ax0] = kanten[:, x1 - ax0:] = False
+            (py, px) = np.nonzero(kanten)
+            if len(py):
+                with PROFILER.stage("antialias", 0, len(py) * n * n):
+                    # Pixelabstand, Strahlen gleichmäßig über n x n Teilfelder des Pixels, in jedem Teilfeld verschoben:
+                    # festes Zufallsmuster plus Versatz je Pixel (R2-Folge), unabhängig von der Kachelaufteilung
+                    dx = (S[2] - S[0]) / max(width - 1, 1)
+                    dy = (S[3] - S[1]) / max(height - 1, 1)
+                    (sy, sx) = np.divmod(np.arange(n * n), n)
+                    muster = np.random.default_rng(n).random((2, n * n))
+                    versatz = ((px + ax0) * 0.7548776662466927 + (py + ay0) * 0.5698402909980532)[:, None]
+                    k = py * (ax1 - ax0) + px
+                    xs = x[k, None] + ((sx + (muster[0] + versatz) % 1) / n - .5) * dx
+                    ys = y[k, None] + ((sy + (muster[1] + versatz) % 1) / n - .5) * dy
+                    (proben, _) = self.trace_pixels(scene, xs.ravel(), ys.ravel())
+                    bild[py, px] = proben.reshape(len(k), n * n, 3).mean(axis=1)
+        return bild[y0 - ay0:y1 - ay0, x0 - ax0:x1 - ax0]
+
+    # Farben (n, 3) mit Werten 0..255 und getroffene Objekte (n,) für die Bildschirmpunkte (x, y)
+    def trace_pixels(self, scene, x, y):
+        with PROFILER.stage("camera", 0, len(x)):
+            Q = vec3(x, y, 0)
+            D = (Q - E).normalize()
+        with PROFILER.stage("intersect", 0, len(x)):
+            (nearest, hitobj, face) = nearest_hit(E, D, scene)
+        color = shade(E, D, nearest, hitobj, face, scene, 0, self.lights, 1.0,
+                      Limits(self.max_bounce, self.min_weight, self.roulette))
+
+        with PROFILER.stage("convert", 0, len(x)):
+            #rgb = [Image.fromarray((255 * np.clip(c, 0, 1).reshape((self.height, self.width))).astype(np.uint8), "L") for c in color.components()] # von rt3.py
+            rgb = [(255 * np.clip(c, 0, 1)) for c in color.components()]
+            return (np.array(rgb).T, hitobj)
     
 
 
@@ -520,12 +912,17 @@ class RenderWindow:
         
 
     def run(self):
+        # gerendert wird im Hintergrund, hier wird nur das jeweils neueste Bild gezeigt
+        renderer = RenderThread(self.scene)
+        renderer.start()
         while not glfw.window_should_close(self.window) and not self.exitNow:
             glfw.poll_events()
             glClear(GL_COLOR_BUFFER_BIT)
-            self.scene.render()
+            renderer.request()
+            self.scene.show(renderer.frames)
             glfw.swap_buffers(self.window)
         # end
+        renderer.stop()
         glfw.terminate()
 
 
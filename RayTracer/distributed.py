@@ -0,0 +1,328 @@
+import argparse
+import collections
+import os
+import pickle
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from tiles import split_tiles
+
+
+# Kacheln auf mehreren Rechnern (Render-Knoten) über Sockets rendern:
+#   python distributed.py worker 0.0.0.0:5000          # auf jedem Knoten (oder ein Unix-Socket-Pfad)
+#   scene.nodes = ["knoten1:5000", "knoten2:5000"]     # im Hauptprozess, dann wie immer raytrace_image()
+#   python distributed.py local --workers 3 --kill 1   # Test auf einem Rechner mit lokalen Workern
+# Jeder Worker bekommt die Szene (gepickelte Scene ohne Bilder und aufgebaute Szene) nur, wenn sie sich
+# geändert hat (z.B. Drehung), danach nur Kachelaufträge, und schickt die Pixel roh (float64) zurück.
+# Jeder Worker hat höchstens prefetch Aufträge offen, wer fertig ist, bekommt die nächste Kachel.
+# Ist nichts mehr offen, übernimmt ein freier Worker zusätzlich die älteste Kachel eines anderen
+# (Work Stealing, das erste Ergebnis zählt). Bricht die Verbindung zu einem Worker ab oder kommt von
+# ihm TIMEOUT Sekunden lang kein Ergebnis, obwohl er Kacheln hat (hängt), gehen seine Kacheln an die
+# anderen. Nur in vertrauenswürdigen Netzen verwenden (pickle).
+
+HEADER = struct.Struct("!4sI")          # Typ, Länge der Nutzdaten
+JOB = struct.Struct("!II4I")            # Bild, Kachel, x0, y0, x1, y1
+RESULT = struct.Struct("!II4Id")        # dazu die Renderzeit im Worker, danach die Pixel
+TIMEOUT = 60.0                          # Sekunden ohne Antwort, nach denen ein Worker als ausgefallen gilt (Scene.node_timeout)
+
+
+# "host:port" für TCP, sonst Pfad eines Unix-Sockets
+def open_socket(address):
+    if "/" in address or ":" not in address:
+        return (socket.socket(socket.AF_UNIX, socket.SOCK_STREAM), address)
+    (host, port) = address.rsplit(":", 1)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return (sock, (host, int(port)))
+
+def send(sock, typ, kopf, daten=b""):
+    daten = memoryview(daten).cast("B")
+    sock.sendall(HEADER.pack(typ, len(kopf) + len(daten)) + kopf)
+    if len(daten):
+        sock.sendall(daten)
+
+def recv_exact(sock, n):
+    puffer = bytearray(n)
+    ansicht = memoryview(puffer)
+    while n:
+        k = sock.recv_into(ansicht, n)
+        if not k:
+            raise ConnectionError("Verbindung geschlossen")
+        ansicht = ansicht[k:]
+        n -= k
+    return puffer
+
+def recv(sock):
+    (typ, laenge) = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return (typ, recv_exact(sock, laenge))
+
+
+# Szene für die Worker: ohne Bilder-Cache, Vorschau, aufgebaute Szene und Messwerte (Scene.__getstate__),
+# so bleibt sie klein und ändert sich nur mit der Szene selbst
+def describe(scene):
+    kopie = object.__new__(type(scene))
+    kopie.__dict__.update(scene.__getstate__())
+    kopie.nodes = []
+    return pickle.dumps(kopie)
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Worker
+
+def serve(address):
+    (sock, ziel) = open_socket(address)
+    if sock.family == socket.AF_UNIX and os.path.exists(ziel):
+        os.unlink(ziel)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(ziel)
+    sock.listen()
+    print("Worker %d wartet auf %s" % (os.getpid(), address), flush=True)
+    basis = None # aufgebaute Szene, bleibt über Verbindungen und Szenenwechsel erhalten (Schlüssel in Scene.build_scene)
+    while True:
+        (conn, _) = sock.accept()
+        if conn.family != socket.AF_UNIX:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        scene = None
+        try:
+            while True:
+                (typ, daten) = recv(conn)
+                if typ == b"SCEN":
+                    scene = pickle.loads(daten)
+                    scene.basis = basis
+                elif typ == b"TILE":
+                    (frame, tile, x0, y0, x1, y1) = JOB.unpack(daten)
+                    start = time.perf_counter()
+                    pixel = np.ascontiguousarray(scene.raytrace_tile(x0, y0, x1, y1), dtype="<f8")
+                    basis = scene.basis
+                    send(conn, b"PIXL", RESULT.pack(frame, tile, x0, y0, x1, y1, time.perf_counter() - start), pixel)
+        except ConnectionError:
+            pass
+        finally:
+            conn.close()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Koordinator
+
+class Connection:
+    def __init__(self, address, sock):
+        self.address = address
+        self.sock = sock
+        self.scene = None       # zuletzt geschickte Szene (pickle)
+        self.jobs = collections.OrderedDict() # offene Kacheln dieses Bildes -> Zeitpunkt der Vergabe
+        self.ausstehend = 0     # geschickte Kacheln ohne Ergebnis, auch aus früheren Bildern
+        self.zuletzt = 0        # letzte Antwort bzw. Vergabe an den bis dahin untätigen Worker
+
+
+class Coordinator:
+    def __init__(self, addresses, prefetch=2, timeout=TIMEOUT):
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.frame = 0
+        self.connections = []
+        for address in addresses:
+            (sock, ziel) = open_socket(address)
+            sock.settimeout(timeout) # auch Senden und Empfangen einer angefangenen Nachricht warten nicht ewig
+            try:
+                sock.connect(ziel)
+            except OSError as e:
+                print("Worker %s nicht erreichbar: %s" % (address, e), file=sys.stderr)
+                sock.close()
+                continue
+            self.connections.append(Connection(address, sock))
+        if not self.connections:
+            raise ConnectionError("kein Worker erreichbar: %s" % ", ".join(addresses))
+
+    def close(self):
+        for c in self.connections:
+            c.sock.close()
+        self.connections = []
+
+    def assign(self, c, tile, tiles):
+        if not c.ausstehend:
+            c.zuletzt = time.perf_counter()
+        c.ausstehend += 1
+        c.jobs[tile] = time.perf_counter()
+        send(c.sock, b"TILE", JOB.pack(self.frame, tile, *tiles[tile]))
+
+    # Verbindung weg (oder Worker hängt): ihre Kacheln kommen wieder nach vorne in die Warteschlange
+    def drop(self, c, offen, fertig, selector, grund="ausgefallen"):
+        print("Worker %s %s, %d Kacheln neu vergeben" % (c.address, grund, len(c.jobs)), file=sys.stderr)
+        selector.unregister(c.sock)
+        c.sock.close()
+        self.connections.remove(c)
+        offen.extendleft(t for t in reversed(c.jobs) if t not in fertig)
+
+    # freie Plätze auffüllen, bei leerer Warteschlange die älteste Kachel eines anderen übernehmen
+    def refill(self, c, tiles, offen, fertig):
+        while len(c.jobs) < self.prefetch and offen:
+            tile = offen.popleft()
+            if tile not in fertig:
+                self.assign(c, tile, tiles)
+        if not c.jobs and not offen:
+            fremd = [(zeit, tile) for d in self.connections if d is not c
+                     for (tile, zeit) in d.jobs.items() if tile not in fertig]
+            if fremd:
+                self.assign(c, min(fremd)[1], tiles)
+
+    # rendert scene kachelweise auf den Workern direkt in out (Form (height, width, 3)),
+    # zurück kommen die Zeiten je Kachel wie bei tiles.render_tiles: ((x0, y0, x1, y1), Sekunden, Worker)
+    def render(self, scene, out, tile_size):
+        self.frame += 1
+        tiles = split_tiles(out.shape[1], out.shape[0], tile_size)
+        offen = collections.deque(range(len(tiles)))
+        fertig = set()
+        times = []
+        beschreibung = describe(scene)
+        selector = selectors.DefaultSelector()
+        try:
+            for c in list(self.connections):
+                c.jobs.clear()
+                c.sock.settimeout(self.timeout)
+                selector.register(c.sock, selectors.EVENT_READ, c)
+                try:
+                    if c.scene != beschreibung:
+                        send(c.sock, b"SCEN", beschreibung)
+                        c.scene = beschreibung
+                    self.refill(c, tiles, offen, fertig)
+                except OSError:
+                    self.drop(c, offen, fertig, selector)
+
+            while len(fertig) < len(tiles):
+                if not self.connections:
+                    raise ConnectionError("alle Worker ausgefallen, %d Kacheln fehlen" % (len(tiles) - len(fertig)))
+                # höchstens bis zur Frist des Workers warten, der am längsten nicht geantwortet hat
+                fristen = [c.zuletzt + self.timeout for c in self.connections if c.ausstehend]
+                warten = max(min(fristen) - time.perf_counter(), 0) if fristen else None
+                for (key, _) in selector.select(warten):
+                    c = key.data
+                    try:
+                        (typ, daten) = recv(c.sock)
+                    except OSError: # auch socket.timeout mitten in einer Nachricht
+                        self.drop(c, offen, fertig, selector)
+                        continue
+                    c.ausstehend -= 1
+                    c.zuletzt = time.perf_counter()
+                    (frame, tile, x0, y0, x1, y1, sekunden) = RESULT.unpack_from(daten)
+                    if frame != self.frame: # übernommene Kachel vom letzten Bild
+                        continue
+                    c.jobs.pop(tile, None)
+                    if tile not in fertig:
+                        fertig.add(tile)
+                        out[y0:y1, x0:x1] = np.frombuffer(daten, dtype="<f8", offset=RESULT.size).reshape(y1 - y0, x1 - x0, 3)
+                        times.append((tiles[tile], sekunden, c.address))
+                # hängt, wer über der Frist ist und auch jetzt nichts zum Lesen hat (sonst lag es nur am Warten auf andere)
+                jetzt = time.perf_counter()
+                bereit = {key.data for (key, _) in selector.select(0)}
+                for c in list(self.connections):
+                    if c.ausstehend and c not in bereit and jetzt - c.zuletzt > self.timeout:
+                        self.drop(c, offen, fertig, selector, "antwortet seit %.0f s nicht" % (jetzt - c.zuletzt))
+                # alle auffüllen, auch die, die gerade nichts zu tun hatten
+                for c in list(self.connections):
+                    try:
+                        self.refill(c, tiles, offen, fertig)
+                    except OSError:
+                        self.drop(c, offen, fertig, selector)
+        finally:
+            selector.close()
+        return times
+
+
+# ein Koordinator je Liste von Adressen, die Verbindungen bleiben zwischen den Bildern offen
+coordinators = {}
+
+def render_distributed(scene, out, addresses, tile_size, timeout=TIMEOUT):
+    key = tuple(addresses)
+    if key not in coordinators or not coordinators[key].connections:
+        coordinators[key] = Coordinator(addresses, timeout=timeout)
+    coordinators[key].timeout = timeout
+    return coordinators[key].render(scene, out, tile_size)
+
+
+# n Worker-Prozesse auf diesem Rechner, jeder an einem Unix-Socket in ordner: (Adressen, Prozesse)
+def spawn_local_workers(n, ordner=None):
+    ordner = ordner or tempfile.mkdtemp(prefix="raytracer_")
+    addresses = [os.path.join(ordner, "worker%d.sock" % i) for i in range(n)]
+    prozesse = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", a],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+                for a in addresses]
+    for a in addresses: # warten, bis alle lauschen
+        while not os.path.exists(a):
+            time.sleep(0.01)
+    return (addresses, prozesse)
+
+
+# Test auf einem Rechner: Bild verteilt rendern (optional mit absichtlich beendeten bzw. angehaltenen
+# Workern) und mit dem Bild aus einem Prozess vergleichen
+def local_test(args):
+    from daudrich_raytracer import Scene
+    from tiles import tile_report
+
+    (addresses, prozesse) = spawn_local_workers(args.workers)
+    try:
+        scene = Scene(args.width, args.height, "Verteilt")
+        scene.model = args.model
+        scene.tile_size = args.tile_size
+        scene.progressive = False
+        scene.nodes = addresses
+        scene.node_timeout = args.timeout
+        abweichung = 0
+        for frame in range(args.frames):
+            scene.anzahlPos = frame
+            if args.kill and frame == args.frames - 1: # im letzten Bild Worker mittendrin beenden
+                for p in prozesse[:args.kill]:
+                    ausfall = (lambda p=p: p.send_signal(signal.SIGSTOP)) if args.hang else p.kill
+                    threading.Timer(args.kill_after, ausfall).start()
+            start = time.perf_counter()
+            verteilt = scene.raytrace_image()
+            wand = time.perf_counter() - start
+            print("Bild %d: %.3f s, %s" % (frame + 1, wand, tile_report(scene.tile_times, wand)), flush=True)
+
+            scene.nodes = []
+            lokal = scene.raytrace_image()
+            scene.nodes = addresses
+            abweichung = max(abweichung, np.abs(verteilt - lokal).max())
+        print("größte Abweichung zum Rendern in einem Prozess: %g" % abweichung)
+        return 0 if abweichung == 0 else 1
+    finally:
+        for c in coordinators.values():
+            c.close()
+        for p in prozesse:
+            p.kill()
+            p.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Raytracer-Kacheln verteilt über Sockets rendern")
+    befehle = parser.add_subparsers(dest="befehl", required=True)
+    worker = befehle.add_parser("worker", help="Kachelaufträge annehmen")
+    worker.add_argument("address", help="host:port (TCP) oder Pfad eines Unix-Sockets")
+    local = befehle.add_parser("local", help="Test mit lokalen Workern")
+    local.add_argument("--workers", type=int, default=3)
+    local.add_argument("--width", type=int, default=320)
+    local.add_argument("--height", type=int, default=240)
+    local.add_argument("--frames", type=int, default=2)
+    local.add_argument("--tile-size", type=int, default=32)
+    local.add_argument("--model", help="OBJ-Datei als Mesh in der Szene")
+    local.add_argument("--kill", type=int, default=0, help="so viele Worker im letzten Bild beenden")
+    local.add_argument("--kill-after", type=float, default=0.05, help="Sekunden nach Bildbeginn")
+    local.add_argument("--hang", action="store_true", help="Worker anhalten (SIGSTOP) statt beenden")
+    local.add_argument("--timeout", type=float, default=TIMEOUT, help="Sekunden, bis ein hängender Worker ausfällt")
+    args = parser.parse_args(argv)
+    if args.befehl == "worker":
+        serve(args.address)
+        return 0
+    return local_test(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+
+# Bilddateien, in die direkt gerendert wird (Scene.raytrace_image(out=...)): der Inhalt ist ein
+# np.memmap der Form (height, width, 3) uint8, im Speicher liegt also nie das ganze Bild.
+# Die Datei ist von Anfang an vollständig (noch schwarz) und kann schon während des Renderns
+# gelesen werden, fertige Kachelzeilen werden sofort geschrieben.
+#   .ppm  P6-Kopf, danach die Pixel (jedes Bildprogramm)
+#   .npy  numpy-Format, z.B. np.load(path, mmap_mode="r")
+
+def open_ppm(path, width, height):
+    kopf = b"P6\n%d %d\n255\n" % (width, height)
+    with open(path, "wb") as f:
+        f.write(kopf)
+        f.truncate(len(kopf) + width * height * 3)
+    return np.memmap(path, dtype=np.uint8, mode="r+", offset=len(kopf), shape=(height, width, 3))
+
+def open_npy(path, width, height):
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+
+OPENERS = {".ppm": open_ppm, ".npy": open_npy}
+
+def open_image(path, width, height):
+    endung = os.path.splitext(path)[1].lower()
+    if endung not in OPENERS:
+        raise ValueError("%s: nur %s können direkt beschrieben werden" % (path, ", ".join(OPENERS)))
+    return OPENERS[endung](path, width, height)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+# Lichtquellen für die Schattierung. Jede liefert mit samples() Punktlichter:
+# Positionen (n, 3) und Farben (n, 3), die Farben aller Proben einer Lichtquelle
+# ergeben zusammen ihre Farbe. Alle Proben werden in einem Durchgang schattiert.
+
+def punkt(p):
+    if hasattr(p, "components"): # vec3
+        p = p.components()
+    return np.ravel(np.asarray(p, dtype=float))
+
+
+class PointLight:
+    def __init__(self, position, color=(1, 1, 1)):
+        self.position = punkt(position)
+        self.color = punkt(color)
+
+    def samples(self):
+        return (self.position[None, :], self.color[None, :])
+
+
+# Parallelogramm center +- u/2 +- v/2, abgetastet mit n x n Proben (je Teilfeld eine, fest verschoben),
+# damit die Schatten weiche Ränder bekommen
+class AreaLight:
+    def __init__(self, center, u, v, color=(1, 1, 1), n=3):
+        self.center = punkt(center)
+        self.u = punkt(u)
+        self.v = punkt(v)
+        self.color = punkt(color)
+        self.n = n
+
+    def samples(self):
+        (t, s) = np.divmod(np.arange(self.n * self.n), self.n)
+        zufall = np.random.default_rng(self.n).random((2, self.n * self.n)) # gleiches Muster in jedem Bild
+        s = (s + zufall[0]) / self.n - .5
+        t = (t + zufall[1]) / self.n - .5
+        positionen = self.center + s[:, None] * self.u + t[:, None] * self.v
+        return (positionen, np.tile(self.color / (self.n * self.n), (self.n * self.n, 1)))
+
+
+# alle Proben aller Lichtquellen: Positionen (3, S) und Farben (3, S)
+def light_samples(lights):
+    proben = [light.samples() for light in lights]
+    if not proben:
+        return (np.zeros((3, 0)), np.zeros((3, 0)))
+    return (np.concatenate([p for (p, c) in proben]).T, np.concatenate([c for (p, c) in proben]).T)
@@ -0,0 +1,152 @@
+import numpy as np
+from numba import njit, prange
+
+from packed import SPHERE, TRIANGLE, PLANE
+
+
+# Numba-Backend (siehe backend.py): dieselbe Rechnung wie die numpy-Kernel in packed.py,
+# aber als Schleife je Strahl (parallel über prange) und je Primitiv, ohne die
+# (Primitive x Strahlen) Matrizen und sonstigen Zwischenarrays. Kompiliert wird beim ersten
+# Aufruf je Genauigkeit, das Ergebnis landet im __pycache__ (cache=True).
+# Ergebnisse weichen höchstens in den letzten Bits von numpy ab (andere Rechenreihenfolge).
+# Threads: NUMBA_NUM_THREADS bzw. numba.set_num_threads, bei Kacheln auf mehreren Prozessen
+# (Scene.workers > 1) am besten 1.
+
+jit = njit(cache=True, error_model="numpy") # Division durch 0 gibt inf/nan wie in numpy
+pjit = njit(cache=True, error_model="numpy", parallel=True)
+
+
+# Abstand je Primitiv j zum Strahl (o, d), faraway ohne Treffer
+@jit
+def sphere_hit(arrays, j, ox, oy, oz, dx, dy, dz, faraway):
+    (C, R) = arrays
+    (cx, cy, cz, r) = (C[j, 0], C[j, 1], C[j, 2], R[j])
+    b = 2 * ((dx * (ox - cx)) + (dy * (oy - cy)) + (dz * (oz - cz)))
+    c = ((cx * cx) + (cy * cy) + (cz * cz)) + ((ox * ox) + (oy * oy) + (oz * oz)) - 2 * ((cx * ox) + (cy * oy) + (cz * oz)) - (r * r)
+    disc = (b * b) - (4 * c)
+    if disc <= 0:
+        return faraway
+    sq = np.sqrt(disc)
+    h0 = (-b - sq) / 2
+    h1 = (-b + sq) / 2
+    h = h0 if (h0 > 0) and (h0 < h1) else h1
+    return h if h > 0 else faraway
+
+@jit
+def triangle_hit(arrays, j, ox, oy, oz, dx, dy, dz, faraway):
+    (A, U, V) = arrays
+    (ux, uy, uz, vx, vy, vz) = (U[j, 0], U[j, 1], U[j, 2], V[j, 0], V[j, 1], V[j, 2])
+    (wx, wy, wz) = (ox - A[j, 0], oy - A[j, 1], oz - A[j, 2])
+    (px, py, pz) = ((dy * vz) - (dz * vy), (dz * vx) - (dx * vz), (dx * vy) - (dy * vx))
+    inv = 1 / ((px * ux) + (py * uy) + (pz * uz))
+    r = inv * ((px * wx) + (py * wy) + (pz * wz))
+    if not (r >= 0 and r <= 1): # auch NaN (parallel zur Ebene)
+        return faraway
+    (qx, qy, qz) = ((wy * uz) - (wz * uy), (wz * ux) - (wx * uz), (wx * uy) - (wy * ux))
+    s = inv * ((qx * dx) + (qy * dy) + (qz * dz))
+    if not (s >= 0 and s <= 1 and r + s <= 1):
+        return faraway
+    t = inv * ((qx * vx) + (qy * vy) + (qz * vz))
+    return t if t > 0 else faraway
+
+@jit
+def plane_hit(arrays, j, ox, oy, oz, dx, dy, dz, faraway):
+    (C, N) = arrays
+    (nx, ny, nz) = (N[j, 0], N[j, 1], N[j, 2])
+    t = -((nx * (ox - C[j, 0])) + (ny * (oy - C[j, 1])) + (nz * (oz - C[j, 2]))) / ((nx * dx) + (ny * dy) + (nz * dz))
+    return t if t > 0 else faraway
+
+
+# O (3, n) oder (3, 1) für einen gemeinsamen Ursprung, D (3, n)
+@pjit
+def nearest_loop(hit, arrays, O, D, faraway, best, which):
+    m = arrays[0].shape[0]
+    schritt = 0 if O.shape[1] == 1 else 1
+    for i in prange(D.shape[1]):
+        k = i * schritt
+        (ox, oy, oz, dx, dy, dz) = (O[0, k], O[1, k], O[2, k], D[0, i], D[1, i], D[2, i])
+        bt = best[i]
+        bj = -1
+        for j in range(m):
+            t = hit(arrays, j, ox, oy, oz, dx, dy, dz, faraway)
+            if t < bt:
+                bt = t
+                bj = j
+        best[i] = bt
+        which[i] = bj
+
+# Strahl hört beim ersten Primitiv näher als maxdist auf, Primitive mit owner == skip zählen nicht
+@pjit
+def any_hit_loop(hit, arrays, O, D, maxdist, faraway, owner, skip, blocked):
+    m = arrays[0].shape[0]
+    schritt = 0 if O.shape[1] == 1 else 1
+    for i in prange(D.shape[1]):
+        k = i * schritt
+        (ox, oy, oz, dx, dy, dz) = (O[0, k], O[1, k], O[2, k], D[0, i], D[1, i], D[2, i])
+        for j in range(m):
+            if owner[j] != skip[i] and hit(arrays, j, ox, oy, oz, dx, dy, dz, faraway) < maxdist[i]:
+                blocked[i] = True
+                break
+
+# Lambert und Blinn-Phong je Treffer t, summiert über die Lichtproben s (Strahl s * k + t)
+@pjit
+def lighting_loop(N, toO, toL, seelight, C, lambert, glanz):
+    (S, k) = (C.shape[1], N.shape[1])
+    for t in prange(k):
+        (nx, ny, nz) = (N[0, t], N[1, t], N[2, t])
+        for c in range(3):
+            lambert[c, t] = 0
+            glanz[c, t] = 0
+        for s in range(S):
+            q = s * k + t
+            if not seelight[q]:
+                continue
+            (lx, ly, lz) = (toL[0, q], toL[1, q], toL[2, q])
+            lv = max((nx * lx) + (ny * ly) + (nz * lz), 0)
+            (hx, hy, hz) = (lx + toO[0, t], ly + toO[1, t], lz + toO[2, t])
+            laenge = np.sqrt((hx * hx) + (hy * hy) + (hz * hz))
+            phong = ((nx * hx) + (ny * hy) + (nz * hz)) / laenge if laenge > 0 else 0
+            phong = min(max(phong, 0), 1) ** 50
+            for c in range(3):
+                lambert[c, t] += C[c, s] * lv
+                glanz[c, t] += C[c, s] * phong
+
+
+def spalten(v, dtype):
+    return np.ascontiguousarray(np.stack(np.broadcast_arrays(*v)).reshape(3, -1), dtype=dtype)
+
+class NumbaBackend:
+    name = "numba"
+    hits = {SPHERE: sphere_hit, TRIANGLE: triangle_hit, PLANE: plane_hit}
+
+    def nearest(self, kind, arrays, O, D, faraway):
+        D = spalten(D, D[0].dtype)
+        n = D.shape[1]
+        best = np.full(n, faraway, dtype=D.dtype)
+        which = np.full(n, -1, dtype=int)
+        if n and len(arrays[0]):
+            nearest_loop(self.hits[kind], tuple(np.ascontiguousarray(a) for a in arrays), spalten(O, D.dtype), D,
+                         D.dtype.type(faraway), best, which)
+        return (best, which)
+
+    def any_hit(self, kind, arrays, O, D, maxdist, faraway, owner=None, skip=None):
+        D = spalten(D, D[0].dtype)
+        n = D.shape[1]
+        blocked = np.zeros(n, dtype=bool)
+        if not n or not len(arrays[0]):
+            return blocked
+        if skip is None: # nichts überspringen
+            (owner, skip) = (np.zeros(len(arrays[0]), dtype=int), np.full(n, -1))
+        any_hit_loop(self.hits[kind], tuple(np.ascontiguousarray(a) for a in arrays), spalten(O, D.dtype), D,
+                     np.ascontiguousarray(np.broadcast_to(maxdist, n), dtype=D.dtype), D.dtype.type(faraway),
+                     np.ascontiguousarray(owner, dtype=int), np.ascontiguousarray(skip, dtype=int), blocked)
+        return blocked
+
+    def lighting(self, N, toO, toL, seelight, C):
+        k = len(seelight) // max(C.shape[1], 1)
+        dtype = toL.a.dtype
+        (lambert, glanz) = (np.empty((3, k)), np.empty((3, k)))
+        lighting_loop(np.ascontiguousarray(np.broadcast_to(N.a, (3, k)), dtype=dtype),
+                      np.ascontiguousarray(np.broadcast_to(toO.a, (3, k)), dtype=dtype), np.ascontiguousarray(toL.a),
+                      np.ascontiguousarray(seelight), np.ascontiguousarray(C, dtype=dtype), lambert, glanz)
+        return (lambert, glanz)
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+# liest Eckpunkte und Dreiecke einer OBJ-Datei (wie die Modelle im oglViewer):
+# "v x y z" und "f a b c ..." mit a, a/b, a//c oder a/b/c, auch negative (relative) Indizes.
+# Polygone werden als Fächer in Dreiecke zerlegt. Ergebnis: (Punkte (n, 3) float, Dreiecke (m, 3) int, 0-basiert)
+def read_obj(path):
+    punkte = []
+    dreiecke = []
+    with open(path) as f:
+        for line in f:
+            teile = line.split()
+            if not teile:
+                continue
+            if teile[0] == "v":
+                punkte.append(teile[1:4])
+            elif teile[0] == "f":
+                idx = [int(t.split("/")[0]) for t in teile[1:]]
+                idx = [i - 1 if i > 0 else len(punkte) + i for i in idx] # OBJ zählt ab 1, negativ = vom Ende
+                dreiecke.extend((idx[0], idx[k], idx[k + 1]) for k in range(1, len(idx) - 1))
+    return (np.array(punkte, dtype=float).reshape(-1, 3), np.array(dreiecke, dtype=int).reshape(-1, 3))
+
+
+# schon gelesene Dateien, damit nicht jedes Bild (bzw. jede Kachel) das Modell neu einliest
+modelle = {}
+
+def load_obj(path):
+    if path not in modelle:
+        modelle[path] = read_obj(path)
+    return modelle[path]
@@ -0,0 +1,237 @@
+import copy
+
+import numpy as np
+
+
+SPHERE, TRIANGLE, PLANE = 0, 1, 2
+KINDS = {"sphere": SPHERE, "triangle": TRIANGLE, "plane": PLANE, "mesh": TRIANGLE}
+
+CHUNK = 1 << 16     # max. Elemente einer (Primitive x Strahlen) Matrix, darüber wird in Blöcken gerechnet
+
+
+# Die Kernel bekommen die Arrays eines Primitivtyps (je eine Zeile pro Primitiv) und die
+# Strahlen als Komponenten-Tupel O = (ox, oy, oz), D = (dx, dy, dz) mit je Form (n,),
+# ein gemeinsamer Ursprung (Kamera) darf auch skalar bleiben.
+# Sie liefern eine (Primitive, n) Matrix mit der Distanz bzw. faraway, gerechnet wie in
+# den intersect() Methoden von Sphere, Triangle und Plane.
+
+def sphere_kernel(C, R, O, D, faraway):
+    (ox, oy, oz) = O
+    (dx, dy, dz) = D
+    (cx, cy, cz) = C.T[..., None]
+    b = 2 * ((dx * (ox - cx)) + (dy * (oy - cy)) + (dz * (oz - cz)))
+    c = ((cx * cx) + (cy * cy) + (cz * cz)) + ((ox * ox) + (oy * oy) + (oz * oz)) - 2 * ((cx * ox) + (cy * oy) + (cz * oz)) - (R * R)[:, None]
+    disc = (b ** 2) - (4 * c)
+    sq = np.sqrt(np.maximum(0, disc))
+    h0 = (-b - sq) / 2
+    h1 = (-b + sq) / 2
+    h = np.where((h0 > 0) & (h0 < h1), h0, h1)
+    return np.where((disc > 0) & (h > 0), h, faraway)
+
+def triangle_kernel(A, U, V, O, D, faraway):
+    (ox, oy, oz) = O
+    (dx, dy, dz) = D
+    (ux, uy, uz) = U.T[..., None]
+    (vx, vy, vz) = V.T[..., None]
+    (wx, wy, wz) = (ox - A[:, 0, None], oy - A[:, 1, None], oz - A[:, 2, None])
+    # D x v und w x u nur einmal, nicht für t, r und s jeweils neu
+    (px, py, pz) = ((dy * vz) - (dz * vy), (dz * vx) - (dx * vz), (dx * vy) - (dy * vx))
+    (qx, qy, qz) = ((wy * uz) - (wz * uy), (wz * ux) - (wx * uz), (wx * uy) - (wy * ux))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv = 1 / ((px * ux) + (py * uy) + (pz * uz))
+        t = inv * ((qx * vx) + (qy * vy) + (qz * vz))
+        r = inv * ((px * wx) + (py * wy) + (pz * wz))
+        s = inv * ((qx * dx) + (qy * dy) + (qz * dz))
+        pred = (r >= 0) & (r <= 1) & (s >= 0) & (s <= 1) & (r + s <= 1) & (t > 0)
+    return np.where(pred, t, faraway)
+
+def plane_kernel(C, N, O, D, faraway):
+    (ox, oy, oz) = O
+    (dx, dy, dz) = D
+    (nx, ny, nz) = N.T[..., None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = -((nx * (ox - C[:, 0, None])) + (ny * (oy - C[:, 1, None])) + (nz * (oz - C[:, 2, None]))) / ((nx * dx) + (ny * dy) + (nz * dz))
+        return np.where((t > 0), t, faraway)
+
+# nächster Treffer je Strahl über alle übergebenen Primitive eines Typs: (Distanz, Zeile bzw. -1)
+# gerechnet wird in Blöcken von Strahlen und Primitiven, damit die Matrizen im Cache bleiben
+def nearest(kernel, arrays, O, D, faraway):
+    n = len(D[0])
+    best = np.full(n, faraway, dtype=D[0].dtype)
+    which = np.full(n, -1, dtype=int)
+    ray_step = max(256, CHUNK // max(len(arrays[0]), 1))
+    prim_step = max(1, CHUNK // ray_step)
+    for r0 in range(0, n, ray_step):
+        rs = slice(r0, r0 + ray_step)
+        Ob = tuple(o[rs] if np.ndim(o) else o for o in O)
+        Db = tuple(d[rs] for d in D)
+        for a in range(0, len(arrays[0]), prim_step):
+            h = kernel(*[arr[a:a + prim_step] for arr in arrays], Ob, Db, faraway)
+            j = np.argmin(h, axis=0)
+            t = h[j, np.arange(h.shape[1])]
+            naeher = t < best[rs]
+            best[rs][naeher] = t[naeher]
+            which[rs][naeher] = j[naeher] + a
+    return (best, which)
+
+# Schattentest über die übergebenen Primitive eines Typs: True für Strahlen, die irgendein
+# Primitiv näher als maxdist (je Strahl) treffen. Strahlen mit Treffer fallen sofort raus
+# und werden gegen die restlichen Primitive nicht mehr getestet.
+# owner (Objekt je Primitiv) und skip (Objekt je Strahl): Treffer auf das eigene Objekt zählen nicht
+def any_hit(kernel, arrays, O, D, maxdist, faraway, owner=None, skip=None):
+    n = len(D[0])
+    blocked = np.zeros(n, dtype=bool)
+    ray_step = max(256, CHUNK // max(len(arrays[0]), 1))
+    prim_step = max(1, CHUNK // ray_step)
+    for r0 in range(0, n, ray_step):
+        r = np.arange(r0, min(r0 + ray_step, n))
+        for a in range(0, len(arrays[0]), prim_step):
+            Ob = tuple(o[r] if np.ndim(o) else o for o in O)
+            Db = tuple(d[r] for d in D)
+            h = kernel(*[arr[a:a + prim_step] for arr in arrays], Ob, Db, faraway)
+            h = h < maxdist[r]
+            if skip is not None:
+                h &= owner[a:a + prim_step, None] != skip[r]
+            getroffen = h.any(axis=0)
+            blocked[r[getroffen]] = True
+            r = r[~getroffen]
+            if not len(r):
+                break
+    return blocked
+
+# Szene als Struct of Arrays: ein Array-Block pro Primitivtyp, damit alle Kugeln (bzw.
+# Dreiecke, Ebenen) in einem einzigen vektorisierten Aufruf gegen die Strahlen laufen.
+# Jedes Objekt ist ein Primitiv, ein Mesh bringt alle seine Dreiecke als Primitive mit;
+# prim_obj/prim_face sagen, zu welchem Objekt (Index in objects = Material-Id für
+# diffuse/mirror) und welchem Dreieck darin ein Primitiv gehört.
+# Nach außen verhält sie sich wie die Objektliste (Iteration, len, index).
+# dtype ist die Genauigkeit der Arrays (und damit der Kernel), z.B. np.float32,
+# backend rechnet die Kernel ("numpy", "numba", "auto", siehe backend.py).
+# Eine gedrehte Ansicht (rotated()) teilt sich alle Arrays, gedreht werden dann nur die Strahlen.
+class PackedScene:
+    def __init__(self, objects, faraway, dtype=np.float64, backend="numpy"):
+        from backend import get_backend # backend.py braucht selbst die Kernel von hier
+        self.objects = list(objects)
+        self.faraway = faraway
+        self.dtype = dtype
+        self.backend = get_backend(backend)
+        self.drehung = None # Matrix vom gedrehten ins ungedrehte System der Arrays, None = nicht gedreht
+        kind = np.array([KINDS[obj.kind] for obj in self.objects], dtype=int)
+        anzahl = np.array([len(obj.faces) if obj.kind == "mesh" else 1 for obj in self.objects], dtype=int)
+        self.prim_obj = np.repeat(np.arange(len(self.objects)), anzahl)
+        self.prim_face = np.arange(len(self.prim_obj)) - np.repeat(np.cumsum(anzahl) - anzahl, anzahl)
+        self.prim_kind = kind[self.prim_obj]
+        self.prim_slot = np.zeros(len(self.prim_obj), dtype=int) # Zeile im Array-Block des jeweiligen Typs
+        for k in (SPHERE, TRIANGLE, PLANE):
+            self.prim_slot[self.prim_kind == k] = np.arange(np.count_nonzero(self.prim_kind == k))
+
+        def punkte(k, attr):
+            return np.array([getattr(obj, attr).components() for obj in self.objects if KINDS[obj.kind] == k],
+                            dtype=dtype).reshape(-1, 3)
+
+        # Ecken aller Dreiecke, (Dreiecke, 3 Ecken, 3)
+        def ecken(obj):
+            if obj.kind == "mesh":
+                return obj.punkte[obj.faces]
+            return np.array([[obj.posA.components(), obj.posB.components(), obj.posC.components()]]).reshape(1, 3, 3)
+
+        self.sph_id = np.flatnonzero(self.prim_kind == SPHERE)
+        self.sph_c = punkte(SPHERE, "c")
+        self.sph_r = np.array([obj.r for obj in self.objects if obj.kind == "sphere"], dtype=dtype)
+        self.tri_id = np.flatnonzero(self.prim_kind == TRIANGLE)
+        tri = [ecken(obj) for obj in self.objects if KINDS[obj.kind] == TRIANGLE]
+        tri = np.concatenate(tri).astype(dtype) if tri else np.zeros((0, 3, 3), dtype=dtype)
+        self.tri_a = tri[:, 0]
+        self.tri_u = tri[:, 1] - self.tri_a # Kanten, einmal vorberechnet
+        self.tri_v = tri[:, 2] - self.tri_a
+        self.pl_id = np.flatnonzero(self.prim_kind == PLANE)
+        self.pl_c = punkte(PLANE, "c")
+        self.pl_n = punkte(PLANE, "n")
+
+        # Materialien, Index = Objekt
+        self.diffuse = np.array([obj.diffuse.components() for obj in self.objects], dtype=float).reshape(-1, 3)
+        self.mirror = np.array([obj.mirror for obj in self.objects], dtype=float)
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __getitem__(self, i):
+        return self.objects[i]
+
+    def index(self, obj):
+        return self.objects.index(obj)
+
+    # Array-Blöcke je Primitivtyp, wie sie die Kernel bekommen
+    def blocks(self):
+        return ((SPHERE, (self.sph_c, self.sph_r)), (TRIANGLE, (self.tri_a, self.tri_u, self.tri_v)),
+                (PLANE, (self.pl_c, self.pl_n)))
+
+    # dieselbe Szene um winkel um die y-Achse gedreht (wie rotate() der Objekte), objects sind die
+    # schon gedrehten Objekte (für Normalen und Farben beim Schattieren). Arrays und Baum bleiben
+    # ungedreht und werden nicht neu aufgebaut, stattdessen dreht rays() die Strahlen zurück.
+    def rotated(self, winkel, objects):
+        gedreht = copy.copy(self)
+        gedreht.objects = list(objects)
+        gedreht.drehung = None
+        if winkel != 0:
+            (c, s) = (np.cos(winkel), np.sin(winkel))
+            gedreht.drehung = np.array([[c, 0, -s], [0, 1, 0], [s, 0, c]]).T.astype(self.dtype) # inverse Drehung
+        return gedreht
+
+    # Strahlen als Komponenten-Tupel, ein einzelner Ursprung wird skalar (spart volle Arrays in den Kerneln)
+    def rays(self, O, D):
+        D = tuple(np.ravel(np.asarray(c, dtype=self.dtype)) for c in (D.x, D.y, D.z))
+        O = tuple(np.squeeze(np.asarray(c, dtype=self.dtype)) for c in (O.x, O.y, O.z))
+        if self.drehung is not None: # Abstände bleiben beim Drehen gleich
+            D = tuple(self.drehung @ np.stack(D))
+            O = tuple(self.drehung @ np.stack(np.broadcast_arrays(*O)))
+        return (O, D)
+
+    # nächster Treffer je Strahl unter den Primitiven ids: (Distanz, Primitiv bzw. -1)
+    def intersect_ids(self, ids, O, D):
+        best = np.full(len(D[0]), self.faraway, dtype=self.dtype)
+        hit = np.full(len(D[0]), -1, dtype=int)
+        for (k, arrays) in self.blocks():
+            sel = ids[self.prim_kind[ids] == k]
+            if not len(sel):
+                continue
+            rows = self.prim_slot[sel]
+            (t, j) = self.backend.nearest(k, [a[rows] for a in arrays], O, D, self.faraway)
+            naeher = t < best
+            best[naeher] = t[naeher]
+            hit[naeher] = sel[j[naeher]]
+        return (best, hit)
+
+    # True für Strahlen, die unter den Primitiven ids etwas näher als maxdist treffen,
+    # Primitive des Objekts skip (je Strahl, z.B. das gerade schattierte, -1 = keins) zählen nicht
+    def occluded_ids(self, ids, O, D, maxdist, skip):
+        blocked = np.zeros(len(D[0]), dtype=bool)
+        for (k, arrays) in self.blocks():
+            sel = ids[self.prim_kind[ids] == k]
+            offen = np.flatnonzero(~blocked)
+            if not len(sel) or not len(offen):
+                continue
+            rows = self.prim_slot[sel]
+            Oo = tuple(o[offen] if np.ndim(o) else o for o in O)
+            blocked[offen] = self.backend.any_hit(k, [a[rows] for a in arrays], Oo, tuple(d[offen] for d in D),
+                                                  maxdist[offen], self.faraway, self.prim_obj[sel], skip[offen])
+        return blocked
+
+    # Primitive -> (Distanz, Index des Objekts in self.objects bzw. -1, Dreieck im Mesh bzw. 0)
+    def hits(self, best, prim):
+        treffer = prim >= 0
+        return (best, np.where(treffer, self.prim_obj[prim], -1), np.where(treffer, self.prim_face[prim], -1))
+
+    # nächster Treffer je Strahl: (Distanz, Index des Objekts in self.objects bzw. -1, Dreieck im Mesh bzw. 0)
+    def intersect(self, O, D):
+        (O, D) = self.rays(O, D)
+        return self.hits(*self.intersect_ids(np.arange(len(self.prim_obj)), O, D))
+
+    # Schattentest: True für Strahlen, die vor maxdist (Abstand zum Licht) etwas treffen, ohne Objekt skip (je Strahl oder für alle)
+    def occluded(self, O, D, maxdist, skip=-1):
+        (O, D) = self.rays(O, D)
+        skip = np.broadcast_to(skip, D[0].shape)
+        return self.occluded_ids(np.arange(len(self.prim_obj)), O, D, np.asarray(maxdist, dtype=self.dtype), skip)
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+# Messung einzelner Stufen eines Bildes (Schnitt, Schatten, Spiegelung, Umrechnung, ...):
+#   with PROFILER.stage("shadow", bounce, rays=n):
+#       ...
+# Ist die Messung aus (Standard), liefert stage() immer dasselbe leere Objekt, das kostet
+# nur einen Methodenaufruf. Eingeschaltet wird sie von Scene.raytrace_image (Scene.profile).
+# Je Stufe: Wandzeit, Anzahl Strahlen und (mit memory) die höchste zusätzlich belegte
+# Speichermenge in der Stufe laut tracemalloc, also alle numpy-Arrays.
+
+class NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NO_STAGE = NoStage()
+
+
+class Stage:
+    def __init__(self, profiler, name, bounce, rays):
+        self.profiler = profiler
+        self.name = name
+        self.bounce = bounce
+        self.rays = rays
+
+    def __enter__(self):
+        p = self.profiler
+        if p.memory:
+            (aktuell, spitze) = tracemalloc.get_traced_memory()
+            if p.stack: # bisherige Spitze gehört noch zur äußeren Stufe
+                p.stack[-1].spitze = max(p.stack[-1].spitze, spitze)
+            tracemalloc.reset_peak()
+            (self.basis, self.spitze) = (aktuell, aktuell)
+        p.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ende = time.perf_counter()
+        p = self.profiler
+        p.stack.pop()
+        belegt = 0
+        if p.memory:
+            spitze = max(self.spitze, tracemalloc.get_traced_memory()[1])
+            belegt = spitze - self.basis
+            if p.stack:
+                p.stack[-1].spitze = max(p.stack[-1].spitze, spitze)
+        p.events.append({"stage": self.name, "bounce": self.bounce, "start": self.start - p.t0,
+                         "seconds": ende - self.start, "rays": int(self.rays), "bytes": int(belegt),
+                         "depth": len(p.stack)})
+        return False
+
+
+class Profiler(threading.local):
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.events = []
+        self.stack = []
+        self.t0 = time.perf_counter()
+        self.eigenes_tracemalloc = False
+
+    def stage(self, name, bounce=0, rays=0):
+        if not self.enabled:
+            return NO_STAGE
+        return Stage(self, name, bounce, rays)
+
+    # neue Messung beginnen (alte Ereignisse verwerfen)
+    def start(self, memory=True):
+        self.events = []
+        self.stack = []
+        self.t0 = time.perf_counter()
+        self.memory = memory
+        self.eigenes_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self.eigenes_tracemalloc:
+            tracemalloc.start()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        if self.eigenes_tracemalloc:
+            tracemalloc.stop()
+            self.eigenes_tracemalloc = False
+
+    # Summen je (Stufe, Bounce) in der Reihenfolge des ersten Auftretens
+    def report(self):
+        zeilen = {}
+        for e in self.events:
+            z = zeilen.setdefault((e["stage"], e["bounce"]), {"stage": e["stage"], "bounce": e["bounce"], "calls": 0,
+                                                             "seconds": 0.0, "rays": 0, "bytes": 0})
+            z["calls"] += 1
+            z["seconds"] += e["seconds"]
+            z["rays"] += e["rays"]
+            z["bytes"] = max(z["bytes"], e["bytes"])
+        zeilen = sorted(zeilen.values(), key=lambda z: min(e["start"] for e in self.events
+                                                           if (e["stage"], e["bounce"]) == (z["stage"], z["bounce"])))
+        return {"stages": zeilen, "events": list(self.events)}
+
+
+PROFILER = Profiler()
+
+
+# Bericht als Text, eingerückt nach Verschachtelung der ersten Messung jeder Stufe
+def format_report(report):
+    tiefe = {}
+    for e in report["events"]:
+        tiefe.setdefault((e["stage"], e["bounce"]), e["depth"])
+    zeilen = ["%-28s %6s %10s %12s %10s" % ("Stufe", "Aufr.", "ms", "Strahlen", "Spitze MB")]
+    for z in report["stages"]:
+        name = "  " * tiefe[(z["stage"], z["bounce"])] + "%s [%d]" % (z["stage"], z["bounce"])
+        zeilen.append("%-28s %6d %10.1f %12d %10.1f" % (name, z["calls"], 1000 * z["seconds"], z["rays"], z["bytes"] / 2**20))
+    return "\n".join(zeilen)
+
+
+def dump_json(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+
+
+# Chrome-Trace (chrome://tracing bzw. Perfetto): ein "X"-Ereignis je gemessener Stufe
+def dump_chrome_trace(report, path):
+    pid = os.getpid()
+    ereignisse = [{"name": e["stage"], "cat": "bounce %d" % e["bounce"], "ph": "X", "pid": pid, "tid": 0,
+                   "ts": 1e6 * e["start"], "dur": 1e6 * e["seconds"],
+                   "args": {"bounce": e["bounce"], "rays": e["rays"], "bytes": e["bytes"]}}
+                  for e in report["events"]]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": ereignisse, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,93 @@
+import copy
+import threading
+
+import numpy as np
+
+
+# Doppelpuffer zwischen Render-Thread und Fenster: der Render-Thread schreibt immer in den
+# hinteren Puffer und tauscht dann, das Fenster liest nur den vorderen (unter der Sperre,
+# damit er nicht getauscht und überschrieben wird, während er hochgeladen wird).
+class FrameBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.puffer = [None, None]
+        self.ansicht = [None, None]
+        self.vorne = 0
+        self.nummer = 0         # zählt jedes veröffentlichte Bild
+
+    # im Render-Thread: fertiges Bild (uint8) zur Ansicht veröffentlichen
+    def write(self, bild, ansicht):
+        hinten = 1 - self.vorne
+        if self.puffer[hinten] is None or self.puffer[hinten].shape != bild.shape:
+            self.puffer[hinten] = np.empty(bild.shape, dtype=np.uint8)
+        np.copyto(self.puffer[hinten], bild, casting="unsafe")
+        self.ansicht[hinten] = ansicht
+        with self.lock:
+            self.vorne = hinten
+            self.nummer += 1
+
+    # im Fenster: upload(bild, ansicht) mit dem neuesten Bild, falls es neuer als nummer ist;
+    # gibt die Nummer des gezeigten Bildes zurück
+    def read(self, nummer, upload):
+        with self.lock:
+            if self.nummer == nummer or self.puffer[self.vorne] is None:
+                return nummer
+            upload(self.puffer[self.vorne], self.ansicht[self.vorne])
+            return self.nummer
+
+
+# rendert im Hintergrund, damit das Fenster während raytrace_image Eingaben und Größenänderungen
+# verarbeitet. Das Fenster ruft in jedem Durchlauf request() auf, der Thread rendert dann die
+# aktuelle Ansicht (alle Stufen der Vorschau) auf einer Kopie der Szene und legt jede Stufe in
+# frames ab. Ändert sich die Ansicht, wird das laufende Bild abgebrochen (zwischen zwei Streifen).
+class RenderThread(threading.Thread):
+    def __init__(self, scene):
+        super().__init__(daemon=True)
+        self.scene = scene
+        self.frames = FrameBuffer()
+        self.bedingung = threading.Condition()
+        self.ansicht = None     # zuletzt angeforderte Ansicht
+        self.auftrag = None     # Kopie der Szene für die nächste Ansicht
+        self.laufend = True
+        self.basis = None       # aufgebaute Szene (Scene.basis), bleibt zwischen den Ansichten erhalten
+
+    # im Fenster-Thread: neue Ansicht anfordern, falls sie sich geändert hat
+    def request(self):
+        ansicht = self.scene.view_key()
+        if ansicht != self.ansicht:
+            with self.bedingung:
+                self.ansicht = ansicht
+                self.auftrag = copy.copy(self.scene) # Zustand von jetzt, das Fenster ändert die Szene weiter
+                self.bedingung.notify()
+
+    def veraltet(self, ansicht):
+        return not self.laufend or ansicht != self.ansicht
+
+    def stop(self):
+        with self.bedingung:
+            self.laufend = False
+            self.bedingung.notify()
+        self.join()
+
+    def run(self):
+        from daudrich_raytracer import RenderCancelled
+        while True:
+            with self.bedingung:
+                while self.laufend and self.auftrag is None:
+                    self.bedingung.wait()
+                if not self.laufend:
+                    return
+                (scene, self.auftrag) = (self.auftrag, None)
+            ansicht = scene.view_key()
+            scene.basis = self.basis
+            zaehler = (scene.cache_hits, scene.cache_misses)
+            try:
+                for bild in scene.render_stages(lambda: self.veraltet(ansicht)):
+                    self.frames.write(bild, ansicht)
+            except RenderCancelled:
+                pass
+            finally:
+                self.basis = scene.basis
+                # Treffer/Fehlschläge des Caches zählen auf der Szene des Fensters, nicht nur auf der Kopie
+                self.scene.cache_hits += scene.cache_hits - zaehler[0]
+                self.scene.cache_misses += scene.cache_misses - zaehler[1]
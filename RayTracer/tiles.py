@@ -0,0 +1,114 @@
+import mmap
+import multiprocessing
+import os
+import pickle
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# zerlegt das Bild in Kacheln (x0, y0, x1, y1) von höchstens size x size Pixeln
+def split_tiles(width, height, size):
+    return [(x0, y0, min(x0 + size, width), min(y0 + size, height))
+            for y0 in range(0, height, size)
+            for x0 in range(0, width, size)]
+
+
+# ein Pool pro Worker-Anzahl, bleibt zwischen den Frames bestehen (Prozessstart kostet)
+pools = {}
+
+def get_pool(workers):
+    if workers not in pools:
+        pools[workers] = multiprocessing.Pool(workers)
+    return pools[workers]
+
+
+# im Worker: zuletzt angehängtes Ziel (Shared Memory bzw. Datei), damit nicht jede Kachel neu anhängt
+attached = {}
+
+def attach(ziel, shape, dtype):
+    if ziel not in attached:
+        for (shm, out) in attached.values():
+            if shm is not None:
+                shm.close()
+        attached.clear()
+        if ziel[0] == "shm":
+            shm = shared_memory.SharedMemory(name=ziel[1]) # aufräumen (unlink) macht der Hauptprozess
+            attached[ziel] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+        else: # ("file", Pfad, Offset) eines np.memmap
+            attached[ziel] = (None, np.memmap(ziel[1], dtype=dtype, mode="r+", offset=ziel[2], shape=shape))
+    return attached[ziel][1]
+
+# im Worker: aufgebaute Szene (Scene.basis) der letzten Kachel, bleibt über Kacheln und Bilder erhalten,
+# build_scene baut nur bei anderem Schlüssel neu (wie in distributed.serve)
+basis = None
+
+# im Worker: Szene des aktuellen Bildes, aus dem Shared-Memory-Block quelle = (Name, Länge) nur einmal je Bild gelesen
+szene = (None, None)
+
+def load_scene(quelle):
+    global szene
+    if szene[0] != quelle:
+        shm = shared_memory.SharedMemory(name=quelle[0])
+        try:
+            szene = (quelle, pickle.loads(shm.buf[:quelle[1]]))
+        finally:
+            shm.close()
+    return szene[1]
+
+def render_tile(task):
+    global basis
+    (quelle, tile, ziel, shape, dtype) = task
+    start = time.perf_counter()
+    scene = load_scene(quelle)
+    (x0, y0, x1, y1) = tile
+    out = attach(ziel, shape, dtype)
+    scene.basis = basis
+    out[y0:y1, x0:x1] = scene.raytrace_tile(x0, y0, x1, y1)
+    basis = scene.basis
+    if ziel[0] == "file":
+        out.flush()
+    return (tile, time.perf_counter() - start, os.getpid())
+
+
+# rendert scene kachelweise auf workers Prozessen direkt in out (Form (height, width, 3)).
+# Die Worker schreiben in einen gemeinsamen Shared-Memory-Block bzw., wenn out ein np.memmap
+# ist, direkt in dessen Datei. Zurück kommen nur die Zeiten je Kachel: Liste von
+# ((x0, y0, x1, y1), Sekunden, pid).
+def render_tiles(scene, out, workers, tile_size):
+    if isinstance(out, np.memmap) and isinstance(out.base, mmap.mmap): # ganze Datei, keine Teilansicht
+        ziel = ("file", out.filename, out.offset)
+        return run_tiles(scene, out, ziel, workers, tile_size)
+    shm = shared_memory.SharedMemory(create=True, size=out.nbytes)
+    try:
+        times = run_tiles(scene, out, ("shm", shm.name), workers, tile_size)
+        out[...] = np.ndarray(out.shape, dtype=out.dtype, buffer=shm.buf)
+    finally:
+        shm.close()
+        shm.unlink()
+    return times
+
+# die Szene wird einmal je Bild gepickelt und über Shared Memory verteilt, die Aufträge selbst
+# enthalten nur die Kachel
+def run_tiles(scene, out, ziel, workers, tile_size):
+    daten = pickle.dumps(scene, pickle.HIGHEST_PROTOCOL)
+    shm = shared_memory.SharedMemory(create=True, size=len(daten))
+    try:
+        shm.buf[:len(daten)] = daten
+        tasks = [((shm.name, len(daten)), tile, ziel, out.shape, out.dtype.str)
+                 for tile in split_tiles(out.shape[1], out.shape[0], tile_size)]
+        return list(get_pool(workers).imap_unordered(render_tile, tasks))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# kurze Zusammenfassung der Kachelzeiten zum Einstellen der Kachelgröße
+def tile_report(times, wall):
+    if not times:
+        return "keine Kacheln gerendert"
+    t = np.array([sec for (tile, sec, pid) in times])
+    return ("%d Kacheln auf %d Prozessen: min %.1f ms, mittel %.1f ms, max %.1f ms, Summe %.0f ms, "
+            "Wandzeit %.0f ms, Parallelität %.1fx" % (len(t), len({pid for (tile, sec, pid) in times}),
+            1000 * t.min(), 1000 * t.mean(), 1000 * t.max(), 1000 * t.sum(), 1000 * wall, t.sum() / wall))
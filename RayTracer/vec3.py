@@ -0,0 +1,106 @@
+import numbers
+import numpy as np
+
+
+DTYPE = np.float64     # Rechengenauigkeit aller Vektoren, siehe set_precision()
+
+def set_precision(dtype):
+    global DTYPE
+    DTYPE = np.dtype(dtype).type
+
+
+# neues Array in der aktuellen Genauigkeit, für die out= der vec3-Rechnungen
+def empty(shape):
+    return np.empty(shape, DTYPE)
+
+
+# 3D-Vektor bzw. ein Vektor je Strahl: Komponenten als Zeilen eines (3, n) Arrays,
+# ein einzelner Vektor hat n = 1 und broadcastet gegen alle Strahlen.
+# Operatoren liefern neue Vektoren, +=, -=, *= und normalize() rechnen im vorhandenen Array.
+class vec3():
+    __slots__ = ("a",)
+
+    def __init__(self, x, y=None, z=None):
+        if y is None: # schon ein fertiges (3, n) Array
+            self.a = x
+            return
+        (x, y, z) = np.broadcast_arrays(*[np.asarray(c, dtype=DTYPE) for c in (x, y, z)])
+        self.a = np.empty((3, max(x.size, 1)), DTYPE) # eigener Speicher, z.B. für Objekte der Szene
+        self.a[0] = x
+        self.a[1] = y
+        self.a[2] = z
+
+    @property
+    def x(self):
+        return self.a[0]
+    @property
+    def y(self):
+        return self.a[1]
+    @property
+    def z(self):
+        return self.a[2]
+
+    def __mul__(self, other):
+        f = other if isinstance(other, numbers.Number) else np.asarray(other)
+        return vec3(np.multiply(self.a, f, out=empty(np.broadcast_shapes(self.a.shape, np.shape(f)))))
+    def __add__(self, other):
+        return vec3(np.add(self.a, other.a, out=empty(np.broadcast_shapes(self.a.shape, other.a.shape))))
+    def __sub__(self, other):
+        return vec3(np.subtract(self.a, other.a, out=empty(np.broadcast_shapes(self.a.shape, other.a.shape))))
+
+    # in-place, solange die Form passt (sonst z.B. skalare Farbe + Farbe je Strahl: neues Array)
+    def __iadd__(self, other):
+        if np.broadcast_shapes(self.a.shape, other.a.shape) != self.a.shape:
+            return self + other
+        np.add(self.a, other.a, out=self.a)
+        return self
+    def __isub__(self, other):
+        if np.broadcast_shapes(self.a.shape, other.a.shape) != self.a.shape:
+            return self - other
+        np.subtract(self.a, other.a, out=self.a)
+        return self
+    def __imul__(self, other):
+        f = other if isinstance(other, numbers.Number) else np.asarray(other)
+        if np.broadcast_shapes(self.a.shape, np.shape(f)) != self.a.shape:
+            return self * other
+        np.multiply(self.a, f, out=self.a)
+        return self
+
+    def dot(self, other):
+        shape = np.broadcast_shapes(self.a.shape, other.a.shape)[1:]
+        d = np.multiply(self.a[0], other.a[0], out=empty(shape))
+        p = np.multiply(self.a[1], other.a[1], out=empty(shape))
+        d += p
+        d += np.multiply(self.a[2], other.a[2], out=p)
+        return d
+    def __abs__(self):
+        return self.dot(self)
+    # 1 / Länge je Vektor (0 bei Nullvektoren bleibt 0)
+    def inverse_length(self):
+        mag = abs(self)
+        np.sqrt(mag, out=mag)
+        mag[mag == 0] = 1
+        return np.divide(1.0, mag, out=mag)
+    def norm(self):
+        return self * self.inverse_length()
+    def normalize(self):
+        self *= self.inverse_length()
+        return self
+    #cross added:
+    def cross(self,other):
+        out = empty(np.broadcast_shapes(self.a.shape, other.a.shape))
+        tmp = empty(out.shape[1:])
+        for (i, j, k) in ((0, 1, 2), (1, 2, 0), (2, 0, 1)):
+            np.multiply(self.a[j], other.a[k], out=out[i])
+            np.multiply(self.a[k], other.a[j], out=tmp)
+            np.subtract(out[i], tmp, out=out[i])
+        return vec3(out)
+    def components(self):
+        return (self.a[0], self.a[1], self.a[2])
+
+    # nur die Strahlen idx (Index-Array), ein einzelner Vektor bleibt wie er ist
+    def take(self, idx):
+        if self.a.shape[1] == 1:
+            return self
+        return vec3(np.take(self.a, idx, axis=1, out=empty((3, len(idx)))))
+rgb = vec3
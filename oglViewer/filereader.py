@@ -1,95 +1,153 @@
+from collections import namedtuple
+
 import numpy as np
 
-# teilt erstmal alle Zeilen in ein Array
-def getLinesSplitted(path):
-    f = open(path, "r")
-    alleLines = f.readlines()
-    alleLinesSplitted = []
-    for line in alleLines:
-        alleLinesSplitted.append(line.split(' '))
-    f.close()
-    for line in alleLinesSplitted:
-        line[:] = [s.rstrip("\n") for s in line]
-    return alleLinesSplitted
-
-# gibt ein Array vom jeweiligen Buchstaben zurück
-def gesArrayZuEinzArray(gesamtArray, lineStart):
-    einzelnesArray = []
-    for line in gesamtArray:
-        if (line[0] == lineStart):
-            einzelnesArray.append(line)
-    return einzelnesArray
-
-# gibt alle v Werte in einem Array zurück
-def readInV(gesamtArray):
-    einzelnesArray = gesArrayZuEinzArray(gesamtArray, "v")
-    endArray = []
-    for line in einzelnesArray:
-        for ele in line:
-            if (ele != "v"):
-                if (ele != ""):
-                    endArray.append(float(ele))
-    return endArray
-
-# gibt alle vn Werte aus den f in einem Array zurück
-def readInVN(gesamtArray):
-    einzelnesArray = gesArrayZuEinzArray(gesamtArray, "f")
-    vnArray = []
-    for line in einzelnesArray:
-        for ele in line:
-            if (ele != "f"):
-                if (ele != ""):
-                    eleSplitted = ele.split("//")
-                    vnArray.append(int(eleSplitted[1])-1)
-    return vnArray
-
-# gibt alle Punkte aus f zurück, aka ohne vn falls gegeben (quasi nur die Punkt-Indize)
-def readInF(gesamtArray, vn):
-    einzelnesArray = gesArrayZuEinzArray(gesamtArray, "f")
-    endArray = []
-    for line in einzelnesArray:
-        for ele in line:
-            if (ele != "f"):
-                if (ele != ""):
-                    if (vn):
-                        eleSplitted = ele.split("//")
-                        endArray.append(int(eleSplitted[0])-1)
-                    else: 
-                        endArray.append((int(ele))-1)
-    return endArray
-
-# gibt true oder falls zurück, je nachdem, ob vn schon gegeben sind oder nicht
-def hasNormalsGiven(gesamtArray):
-    einzelnesArray = gesArrayZuEinzArray(gesamtArray, "f")
-    hasNormals = False
-    for line in einzelnesArray:
-        for ele in line:
-            if ("//" in ele):
-                hasNormals = True
-    return hasNormals
-
-# Normalenberechnung (von vorheriger Aufgabe), nutzt v und f in originalem Status mit den einzelnen Zeilen
-def normalenBerechnung(gesamtArray):
-    varray = gesArrayZuEinzArray(gesamtArray, "v")
-    farray = gesArrayZuEinzArray(gesamtArray, "f")
-    vnarray = []
-    newfarray = []
-    for line in farray:
-        p1 = varray[int(line[1])-1]
-        p2 = varray[int(line[2])-1]
-        p3 = varray[int(line[3])-1]
-        p1 = [float(p1[1]),float(p1[2]),float(p1[3])]
-        p2 = [float(p2[1]),float(p2[2]),float(p2[3])]
-        p3 = [float(p3[1]),float(p3[2]),float(p3[3])]
-        p1v = np.array(p1)
-        p2v = np.array(p2)
-        p3v = np.array(p3)
-        v1 = np.array(p2v - p1v)
-        v2 = np.array(p3v - p1v)
-        normale = np.cross(v1,v2)
-        vnarray.append(normale.tolist())
-        stelle1 = line[1] + "//" + str(len(vnarray)-1)
-        stelle2 = line[2] + "//" + str(len(vnarray)-1)
-        stelle3 = line[3] + "//" + str(len(vnarray)-1)
-        newfarray.append([line[0], stelle1, stelle2, stelle3])
-    return newfarray
+# Ergebnis von readInObj, alles NumPy:
+#   v (n, 3) float32, vt (t, 2) float32, vn (m, 3) float32 - Werte der v-, vt- und vn-Zeilen
+#   f (k, 3) int32 - Dreiecke als Punkt-Indizes (0-basiert), ft und fn die vt- bzw. vn-Indizes
+#   der Ecken (k, 3) int32 oder None, wenn die f-Zeilen keine haben
+Obj = namedtuple("Obj", "v vt vn f ft fn")
+
+CHUNK = 1 << 22 # so viele Bytes auf einmal lesen
+
+# Zeilenarten: Kennzeichen vorne (danach Leerzeichen oder Tab), Anzahl Werte je Zeile
+V, VT, VN, F = 1, 2, 3, 4
+ARTEN = {V: (b"v", 3), VT: (b"vt", 2), VN: (b"vn", 3), F: (b"f", None)}
+LEER = ord(" ")
+TRENNER = (ord(" "), ord("\t"))
+
+# Ecken-Formate der f-Zeilen: Felder je Ecke und welche Spalten (v, vt, vn) sie füllen
+A, A_B, A_B_C, A__C = 1, 2, 3, 4
+FORMATE = {A: (1, [0]), A_B: (2, [0, 1]), A_B_C: (3, [0, 1, 2]), A__C: (2, [0, 2])}
+
+
+# Art jeder Zeile (0 = sonstige), start = erstes Byte der Zeilen; der Puffer endet mit "\n"
+def zeilenarten(puffer, start):
+    art = np.zeros(len(start), dtype=np.int8)
+    for (a, (kennung, breite)) in ARTEN.items():
+        passt = np.isin(puffer[np.minimum(start + len(kennung), len(puffer) - 1)], TRENNER)
+        for (i, c) in enumerate(kennung):
+            passt &= puffer[np.minimum(start + i, len(puffer) - 1)] == c
+        art[passt] = a
+    return art
+
+
+# Kopie des Puffers, in der die Kennzeichen der erkannten Zeilen durch Leerzeichen ersetzt sind
+def ohne_kennung(puffer, start, art):
+    puffer = puffer.copy()
+    for (a, (kennung, breite)) in ARTEN.items():
+        for i in range(len(kennung)):
+            puffer[start[art == a] + i] = LEER
+    return puffer
+
+
+# Werte einer Art (v, vt, vn) auf einmal einlesen; Zeilen mit mehr Werten (z.B. "v x y z w"
+# oder Farben) werden auf die ersten breite gekürzt
+def zahlen(roh, anzahl, breite):
+    werte = np.fromstring(roh.tobytes(), dtype=np.float32, sep=" ")
+    if len(werte) != anzahl * breite:
+        zeilen = roh.tobytes().decode().splitlines()
+        werte = np.array([z.split()[:breite] for z in zeilen], dtype=np.float32)
+    return werte.reshape(-1, breite)
+
+
+# Ecken (Wörter) und Format (aus FORMATE) je f-Zeile, an den Schrägstrichen der Zeile erkannt;
+# gezählt wird über die Positionen der Zeilenenden, Wortanfänge und Schrägstriche
+def formate(roh):
+    enden = np.flatnonzero(roh == ord("\n"))
+    wort = roh > LEER                           # das erste Byte ist das ersetzte "f"
+    anfang = np.flatnonzero(wort[1:] > wort[:-1]) + 1
+    strich = np.flatnonzero(roh == ord("/"))
+    doppelt = strich[1:][np.diff(strich) == 1]
+    (anzahl, striche, doppelt) = (np.diff(np.r_[0, np.searchsorted(pos, enden)]) for pos in (anfang, strich, doppelt))
+    art = np.where(doppelt > 0, A__C, striche // np.maximum(anzahl, 1) + 1)
+    return (anzahl, art)
+
+
+# f-Zeilen eines Formats -> Ecken (Anzahl, 3) mit v-, vt- und vn-Index (0 = nicht gegeben)
+def ecken_format(roh, art):
+    (felder, spalten) = FORMATE[art]
+    roh = np.where(roh == ord("/"), LEER, roh)
+    werte = np.fromstring(roh.tobytes(), dtype=np.int64, sep=" ")
+    idx = np.zeros((len(werte) // felder, 3), dtype=np.int64)
+    idx[:, spalten] = werte.reshape(-1, felder)
+    return idx
+
+
+# f-Zeilen -> Ecken (Anzahl, 3) wie ecken_format und Ecken je Zeile; Zeilen mit verschiedenen
+# Formaten (z.B. a/b/c und a//c in einer Datei) werden je Format gelesen und wieder in
+# Zeilenreihenfolge gebracht
+def ecken(roh):
+    (anzahl, art) = formate(roh)
+    if (art == art[0]).all():
+        return (ecken_format(roh, art[0]), anzahl)
+    enden = np.flatnonzero(roh == ord("\n"))
+    je_byte = np.repeat(art, np.diff(np.r_[-1, enden]))
+    start = np.cumsum(anzahl) - anzahl         # erste Ecke jeder Zeile im Ergebnis
+    idx = np.empty((anzahl.sum(), 3), dtype=np.int64)
+    for a in np.unique(art):
+        n = anzahl[art == a]
+        ziel = np.repeat(start[art == a], n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        idx[ziel] = ecken_format(roh[je_byte == a], a)
+    return (idx, anzahl)
+
+
+# Polygone mit anzahl Ecken als Fächer (0, i, i + 1) in Dreiecke zerlegen
+def faecher(idx, anzahl):
+    if (anzahl == 3).all():
+        return idx.reshape(-1, 3, 3)
+    start = np.cumsum(anzahl) - anzahl
+    dreiecke = anzahl - 2
+    erste = np.repeat(start, dreiecke)
+    i = np.arange(dreiecke.sum()) - np.repeat(np.cumsum(dreiecke) - dreiecke, dreiecke) + 1
+    return idx[np.stack([erste, erste + i, erste + i + 1], axis=1)]
+
+
+# liest eine OBJ-Datei in einem Durchgang, stückweise (CHUNK Bytes): je Stück wird die Art jeder
+# Zeile an ihren ersten Bytes erkannt und alle Zeilen einer Art (v, vt, vn, f) werden auf einmal
+# mit np.fromstring umgewandelt, ohne Python-Schleife über die Zeilen
+def readInObj(path, chunk=CHUNK):
+    teile = {V: [], VT: [], VN: [], F: []}
+    bisher = np.zeros(3, dtype=np.int64)    # schon gelesene v, vt, vn (für negative Indizes)
+    rest = b""
+    with open(path, "rb") as datei:
+        while True:
+            daten = datei.read(chunk)
+            ende = not daten
+            daten = rest + daten
+            if not ende: # angefangene letzte Zeile kommt zum nächsten Stück
+                schnitt = daten.rfind(b"\n") + 1
+                (daten, rest) = (daten[:schnitt], daten[schnitt:])
+            elif not daten.endswith(b"\n"):
+                daten += b"\n"
+            if daten:
+                puffer = np.frombuffer(daten, dtype=np.uint8)
+                enden = np.flatnonzero(puffer == ord("\n"))
+                start = np.r_[0, enden[:-1] + 1]
+                art = zeilenarten(puffer, start)
+                je_byte = np.repeat(art, enden - start + 1) # Art der Zeile je Byte
+                werte = ohne_kennung(puffer, start, art)
+                for a in (V, VT, VN):
+                    if (art == a).any():
+                        teile[a].append(zahlen(werte[je_byte == a], (art == a).sum(), ARTEN[a][1]))
+                if (art == F).any():
+                    (idx, anzahl) = ecken(werte[je_byte == F])
+                    # Stand von v, vt, vn vor jeder f-Zeile
+                    stand = bisher + np.stack([np.cumsum(art == a)[art == F] for a in (V, VT, VN)], axis=1)
+                    neg = idx < 0 # relativ: -1 ist die zuletzt davor gelesene Zeile der Art
+                    if neg.any():
+                        idx[neg] += (np.repeat(stand, anzahl, axis=0) + 1)[neg]
+                    teile[F].append(faecher(idx, anzahl))
+                bisher += [(art == a).sum() for a in (V, VT, VN)]
+            if ende:
+                break
+
+    def zusammen(a, breite):
+        return np.concatenate(teile[a]) if teile[a] else np.zeros((0, breite), dtype=np.float32)
+
+    ecken_alle = np.concatenate(teile[F]) if teile[F] else np.zeros((0, 3, 3), dtype=np.int64)
+    ecken_alle -= 1 # OBJ zählt ab 1, nicht gegebene Indizes werden -1
+    (f, ft, fn) = (ecken_alle[:, :, i].astype(np.int32) for i in range(3))
+    return Obj(zusammen(V, 3), zusammen(VT, 2), zusammen(VN, 3), f,
+               ft if len(ft) and (ft >= 0).all() else None, fn if len(fn) and (fn >= 0).all() else None)
+
@@ -0,0 +1,38 @@
+import numpy as np
+
+from filereader import readInObj
+from normals import vertexNormalen
+
+# Baut aus den Ecken der OBJ-Flächen (v/vt/vn-Indizes je Ecke, aus filereader.readInObj, dort schon
+# als Fächer trianguliert und mit aufgelösten negativen Indizes) einen einzigen Vertex-Puffer:
+# jede verschiedene Kombination (v, vt, vn) wird genau ein Vertex, dazu ein Index-Puffer.
+# Vertex-Layout (float32, verschachtelt): Position (3), Normale (3), Texturkoordinate (2, nur mit vt).
+
+
+# gleiche Ecken-Tupel zusammenfassen: (ein Tupel je Vertex (n, 3), Vertex je Ecke)
+def verschweissen(ecken):
+    groesse = ecken.max(axis=0).astype(np.int64) + 2  # Indizes ab -1 (nicht gegeben)
+    if np.prod(groesse.astype(float)) < 2 ** 62:       # ein int64-Schlüssel je Ecke
+        schluessel = ((ecken[:, 0] + 1) * groesse[1] + ecken[:, 1] + 1) * groesse[2] + ecken[:, 2] + 1
+        (_, erste, index) = np.unique(schluessel, return_index=True, return_inverse=True)
+        return (ecken[erste], index.astype(np.int32).ravel())
+    (tupel, index) = np.unique(ecken, axis=0, return_inverse=True)
+    return (tupel, index.astype(np.int32).ravel())
+
+
+# fertige Puffer zum Hochladen (für meshcache): verschachtelte Vertices (n, 6 bzw. 8), Indizes flach
+# und die Bounding Box (2, 3) mit Minimum und Maximum je Achse; knick siehe normals.py
+def meshBuffers(path, knick=None):
+    obj = readInObj(path)
+    (vn, fn) = (obj.vn, obj.fn)
+    if (fn is None):            # Normalen nicht gegeben, müssen berechnet werden
+        (vn, fn) = vertexNormalen(obj.v, obj.f, knick)
+    ft = obj.ft if obj.ft is not None else np.full_like(obj.f, -1)
+
+    (tupel, indices) = verschweissen(np.stack([obj.f.ravel(), ft.ravel(), fn.ravel()], axis=1))
+    spalten = [obj.v[tupel[:, 0]], vn[tupel[:, 2]]]
+    if obj.ft is not None:
+        spalten.append(obj.vt[tupel[:, 1]])
+    return {"vertices": np.concatenate(spalten, axis=1).astype(np.float32),
+            "indices": indices,
+            "bounds": np.stack([obj.v.min(axis=0), obj.v.max(axis=0)])}
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Binär-Cache für die Modelle: die fertigen Puffer (dict Name -> Array, z.B. aus meshbuilder.meshBuffers)
+# liegen je Modell als .npy-Dateien in einem Ordner unter CACHE und werden beim nächsten Start nur
+# per Memory-Map geöffnet, statt die OBJ-Datei neu zu lesen. Der Ordnername enthält einen Schlüssel
+# aus Pfad, Größe und Änderungszeit der OBJ-Datei, den Parametern für bauen (z.B. knick) und VERSION,
+# eine geänderte Datei oder andere Parameter ergeben also neue Puffer. VERSION hochzählen, wenn sich
+# ändert, was in den Puffern steht.
+
+CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", ".cache")
+VERSION = 3
+
+
+def schluessel(path, parameter=None):
+    st = os.stat(path)
+    text = "%s|%d|%d|%d|%r" % (os.path.abspath(path), st.st_size, st.st_mtime_ns, VERSION,
+                               sorted((parameter or {}).items()))
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def ordner(path, cache=CACHE, parameter=None):
+    return os.path.join(cache, "%s-%s" % (os.path.basename(path), schluessel(path, parameter)))
+
+
+# Puffer aus dem Cache (schreibgeschützte Memory-Maps) oder None, wenn es keinen passenden gibt
+def lesen(path, cache=CACHE, parameter=None):
+    ziel = ordner(path, cache, parameter)
+    if not os.path.isdir(ziel):
+        return None
+    try:
+        return {datei[:-4]: np.load(os.path.join(ziel, datei), mmap_mode="r")
+                for datei in sorted(os.listdir(ziel)) if datei.endswith(".npy")}
+    except (OSError, ValueError): # kaputt, wird neu geschrieben
+        return None
+
+
+# Puffer in den Cache schreiben; erst in einen temporären Ordner, der dann umbenannt wird, damit ein
+# anderer Prozess nie einen halb geschriebenen Eintrag sieht. Alte Einträge desselben Modells fliegen raus.
+def schreiben(path, puffer, cache=CACHE, parameter=None):
+    ziel = ordner(path, cache, parameter)
+    name = os.path.basename(path)
+    tmp = None
+    try:
+        os.makedirs(cache, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".%s-" % name, dir=cache)
+        for (k, a) in puffer.items():
+            np.save(os.path.join(tmp, k + ".npy"), np.ascontiguousarray(a))
+        if os.path.isdir(ziel):
+            shutil.rmtree(ziel, ignore_errors=True)
+        os.replace(tmp, ziel)
+        tmp = None
+        for alt in os.listdir(cache):
+            if alt.startswith(name + "-") and os.path.join(cache, alt) != ziel:
+                shutil.rmtree(os.path.join(cache, alt), ignore_errors=True)
+    except OSError as e: # z.B. schreibgeschützt: dann eben ohne Cache
+        print("Mesh-Cache nicht geschrieben (%s)" % e)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Puffer zum Modell path: aus dem Cache, sonst mit bauen(path, **parameter) erzeugt und in den Cache gelegt
+def laden(path, bauen, cache=CACHE, **parameter):
+    puffer = lesen(path, cache, parameter)
+    if puffer is None:
+        puffer = bauen(path, **parameter)
+        schreiben(path, puffer, cache, parameter)
+    return puffer
@@ -0,0 +1,58 @@
+import numpy as np
+
+# Normalen für Modelle ohne vn-Zeilen, alles auf einmal über alle Flächen (kein Python je Fläche):
+# Flächennormale = Kreuzprodukt zweier Kanten, ihre Länge ist die doppelte Fläche, die Summe an
+# einer Ecke ist also nach Fläche gewichtet. Ergebnis wie vn und fn aus filereader.readInObj.
+
+
+# Flächennormalen (k, 3), nicht normiert (Länge = doppelte Fläche)
+def flaechenNormalen(v, f):
+    (p1, p2, p3) = (v[f[:, 0]], v[f[:, 1]], v[f[:, 2]])
+    return np.cross(p2 - p1, p3 - p1)
+
+
+def normiert(n):
+    laenge = np.linalg.norm(n, axis=-1, keepdims=True)
+    return n / np.where(laenge > 0, laenge, 1) # entartete Flächen bleiben 0
+
+
+# glatte Normalen je Punkt; mit knick (Grad) nur über Flächen gemittelt, deren Normale höchstens
+# so weit von der eigenen Fläche abweicht (harte Kanten). Gibt (Normalen (m, 3) float32,
+# Normalen-Index je Ecke (k, 3) int32) zurück.
+def vertexNormalen(v, f, knick=None):
+    fnormalen = flaechenNormalen(v.astype(np.float64), f)
+    ecke = f.ravel()                                # Punkt je Ecke, Ecke i gehört zu Fläche i // 3
+    if knick is None or knick >= 180: # alle Flächen am Punkt (auch genau gegenüberliegende)
+        normalen = np.zeros((len(v), 3))
+        np.add.at(normalen, ecke, np.repeat(fnormalen, 3, axis=0))
+        return (normiert(normalen).astype(np.float32), f.astype(np.int32))
+
+    # je Ecke alle Ecken am selben Punkt (Paare innerhalb einer Gruppe nach Punkt sortierter Ecken)
+    order = np.argsort(ecke, kind="stable")
+    sortiert = ecke[order]
+    start = np.flatnonzero(np.r_[True, sortiert[1:] != sortiert[:-1]])
+    anzahl = np.diff(np.r_[start, len(ecke)])
+    gruppe = np.repeat(np.arange(len(start)), anzahl)        # Gruppe je sortierter Ecke
+    paare = anzahl[gruppe]                                   # Paare je sortierter Ecke
+    a = np.repeat(order, paare)                              # Ecke
+    offset = np.arange(paare.sum()) - np.repeat(np.cumsum(paare) - paare, paare)
+    b = order[np.repeat(start[gruppe], paare) + offset]      # Ecke am selben Punkt
+    (fa, fb) = (a // 3, b // 3)
+    einheit = normiert(fnormalen)
+    passt = (einheit[fa] * einheit[fb]).sum(axis=1) >= np.cos(np.radians(knick))
+    normalen = np.stack([np.bincount(a[passt], fnormalen[fb[passt], i], len(ecke)) for i in range(3)], axis=1)
+
+    (normalen, fn) = einmal(normiert(normalen).astype(np.float32))
+    return (normalen, fn.reshape(-1, 3))
+
+
+# gleiche Normalen (gleicher Punkt, gleiche Nachbarflächen) nur einmal: sortiert nach den Bits der
+# drei Komponenten (schneller als np.unique(axis=0)); gibt (Normalen, Index je Eingabezeile) zurück
+def einmal(n):
+    bits = n.view(np.uint32)
+    order = np.lexsort(bits.T[::-1])
+    sortiert = bits[order]
+    neu = np.r_[True, (sortiert[1:] != sortiert[:-1]).any(axis=1)]
+    index = np.empty(len(n), dtype=np.int32)
+    index[order] = np.cumsum(neu) - 1
+    return (n[order[neu]], index)
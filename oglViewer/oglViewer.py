@@ -27,6 +27,7 @@
  ******************************************************************************/
 """
 
+import ctypes
 import math
 import sys
 import glfw
@@ -38,6 +39,8 @@ from OpenGL.GL.shaders import *
 
 from mat4 import *
 from filereader import *
+from meshbuilder import meshBuffers
+from meshcache import laden
 
 EXIT_FAILURE = -1
 
@@ -63,6 +66,7 @@ class Scene:
         self.winkel             = 0
         self.achse              = np.array([0,0,0])
         self.size               = 1
+        self.knick              = None  # Knickwinkel in Grad für berechnete Normalen (harte Kanten), None = alles glatt
 
 
     def init_GL(self):
@@ -85,75 +89,47 @@ class Scene:
         # TODO: 
         # 1. Load geometry from file and calc normals if not available
         # 2. Load geometry and normals in buffer objects
-        if(len(sys.argv) != 2):
-            print("Format: python3 oglViewer.py object.obj")
+        if(len(sys.argv) not in (2, 3)):
+            print("Format: python3 oglViewer.py object.obj [Knickwinkel in Grad]")
             sys.exit(1)
         path = "models/" + sys.argv[1] # nimmt Argument vom obj
+        if(len(sys.argv) == 3):
+            self.knick = float(sys.argv[2])
 
-        gesamtArray = getLinesSplitted(path)
-        varray = readInV(gesamtArray)
-        
-        if (hasNormalsGiven(gesamtArray)):          # Normalen sind gegeben, müssen nur extrahiert werden
-            farray = readInF(gesamtArray, True)
-            vnarray = readInVN(gesamtArray)
-        else:                                       # Normalen nicht gegeben, müssen berechnet werde
-            farray = readInF(gesamtArray, False)
-            objButOnlyF = normalenBerechnung(gesamtArray)
-            vnarray = readInVN(objButOnlyF)
+        puffer = laden(path, meshBuffers, knick=self.knick) # fertige Puffer aus dem Mesh-Cache, sonst aus der OBJ-Datei
         
         # generate vertex array object (VAO)
         self.vertex_array = glGenVertexArrays(1)
         glBindVertexArray(self.vertex_array)
 
-        # generate and fill buffer with vertex positions (attribute 0)
-        self.positions = np.array(varray, dtype=np.float32)
-        pos_buffer = glGenBuffers(1)        # pos_buffer = index of opengl buffer
-        glBindBuffer(GL_ARRAY_BUFFER, pos_buffer)
-        glBufferData(GL_ARRAY_BUFFER, self.positions.nbytes, self.positions, GL_STATIC_DRAW)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
+        # ein verschachtelter Vertex-Puffer (siehe meshbuilder.py): Position (Attribut 0), Normale (Attribut 2),
+        # Texturkoordinate (Attribut 3, falls gegeben); jede v/vt/vn-Kombination nur einmal
+        self.vertices = puffer["vertices"]
+        stride = self.vertices.strides[0]   # Bytes je Vertex
+        vertex_buffer = glGenBuffers(1)     # vertex_buffer = index of opengl buffer
+        glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
         glEnableVertexAttribArray(0)
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(12))
+        glEnableVertexAttribArray(2)
+        if self.vertices.shape[1] > 6:
+            glVertexAttribPointer(3, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(24))
+            glEnableVertexAttribArray(3)
 
+        # Farbe (Attribut 1) für alle Vertices gleich, ohne eigenen Puffer
+        glDisableVertexAttribArray(1)
+        glVertexAttrib3f(1, 1.0, 1.0, 1.0)
+
+
+        # maximale und minimale Koordinaten je Achse (Bounding Box aus dem Puffer)
+        (kleinste, groesste) = np.array(puffer["bounds"], dtype=float)
+        self.maxlen = max(self.maxlen, (groesste - kleinste).max())
+        self.zentrierung = (groesste + kleinste) / (groesste - kleinste)
 
-        # Zeug zum Berechnen der maximalen und minimalen Koordinaten je Achse
-        xmax = xmin = varray[farray[0]]
-        ymax = ymin = varray[farray[1]]
-        zmax = zmin = varray[farray[2]]
-        for i in range(len(varray)):
-            if (i%3 == 0 and i < len(varray)-2):
-                x = varray[farray[i]]
-                y = varray[farray[i+1]]
-                z = varray[farray[i+2]]
-                if x > xmax: xmax = x
-                elif x < xmin: xmin = x
-                if y > ymax: ymax = y
-                elif y < ymin: ymin = y
-                if z > zmax: zmax = z
-                elif z < zmin: zmin = z
-        if(xmax-xmin > self.maxlen): self.maxlen = xmax-xmin 
-        if(ymax-ymin > self.maxlen): self.maxlen = ymax-ymin
-        if(zmax-zmin > self.maxlen): self.maxlen = zmax-zmin
-        self.zentrierung = np.array([(xmax+xmin)/(xmax-xmin), (ymax+ymin)/(ymax-ymin), (zmax+zmin)/(zmax-zmin)])
-
-
-        # Normalengenerieren plus Buffer füllen (Attribut: 1) - aus Foliensatz 7, Folie 27
-        self.normals = np.array(vnarray, dtype=np.int32)
-        normal_buffer = glGenBuffers(1)      # nbo = index of OpenGL buffer  
-        glBindBuffer(GL_ARRAY_BUFFER, normal_buffer)
-        glBufferData(GL_ARRAY_BUFFER, self.normals.nbytes, self.normals, GL_STATIC_DRAW)
-        #glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, 0)
-        #glEnableVertexAttribArray(1)
- 
-        # generate and fill buffer with vertex colors (attribute 1)
-        colarray = [1.0] * len(varray)
-        colors = np.array(colarray, dtype=np.float32)
-        col_buffer = glGenBuffers(1) # grad mal zu 2 geändert, statt 1
-        glBindBuffer(GL_ARRAY_BUFFER, col_buffer)
-        glBufferData(GL_ARRAY_BUFFER, colors.nbytes, colors, GL_STATIC_DRAW)
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, None)
-        glEnableVertexAttribArray(1) # grad mal zu 2 geändert, statt 1
 
         # generate index buffer (for triangle strip)  
-        self.indices = np.array(farray, dtype=np.int32)
+        self.indices = puffer["indices"]
         ind_buffer_object = glGenBuffers(1)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ind_buffer_object)
         glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
@@ -173,7 +149,7 @@ class Scene:
         # 1. Render geometry 
         #    (a) just as a wireframe model and - check
         #    with 
-        #    (b) a shader that realize Gouraud Shading - nope
+        #    (b) a shader that realize Gouraud Shading - check (Kopflicht, shader.vert)
         #    (c) a shader that realize Phong Shading - nope
         # 2. Rotate object around the x, y, z axis using the keys x, y, z - check
         # 3. Rotate object with the mouse by realizing the arcball metaphor as 
@@ -201,7 +177,8 @@ class Scene:
 
         arcballrot = self.aktuelleDrehung @ self.rotatePlus(self.winkel,self.achse) # Drehung auf aktuelle Position anwenden
 
-        mvp_matrix = projection @ view @ model @ translatematrix @ scalematrix @ arcballrot
+        modelview_matrix = view @ model @ translatematrix @ scalematrix @ arcballrot
+        mvp_matrix = projection @ modelview_matrix
 
         # enable shader & set uniforms
         glUseProgram(self.shader_program)
@@ -210,6 +187,8 @@ class Scene:
         varLocation = glGetUniformLocation(self.shader_program, 'modelview_projection_matrix')
         # pass value to shader
         glUniformMatrix4fv(varLocation, 1, GL_TRUE, mvp_matrix)
+        # für die Normalen (Beleuchtung im Vertex-Shader)
+        glUniformMatrix4fv(glGetUniformLocation(self.shader_program, 'modelview_matrix'), 1, GL_TRUE, modelview_matrix)
 
 
         # enable vertex array & draw triangle(s)
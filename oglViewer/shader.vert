@@ -2,11 +2,15 @@
 
 layout (location=0) in vec4 v_position;
 layout (location=1) in vec3 v_color;
+layout (location=2) in vec3 v_normal;   // aus dem verschachtelten Vertex-Puffer (meshbuilder.py)
 uniform mat4 modelview_projection_matrix;
+uniform mat4 modelview_matrix;          // ohne Projektion, für die Normalen (nur gleichmäßig skaliert)
 out vec3 v2f_color;
 
 void main()
 {
-    v2f_color = v_color;
+    // Gouraud: Lambert je Vertex mit einem Licht aus Richtung der Kamera (Kopflicht), beidseitig
+    vec3 n = normalize(mat3(modelview_matrix) * v_normal);
+    v2f_color = v_color * (0.2 + 0.8 * abs(n.z));
     gl_Position = modelview_projection_matrix * v_position;
 }
\ No newline at end of file